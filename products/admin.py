@@ -1,13 +1,42 @@
 from django.contrib import admin
-from .models import Product
+from django.db import transaction
+from .models import Product, InventorySnapshot, ImportBatch, ExportJob
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['id', 'name', 'brand', 'price', 'quantity', 'unit', 'created_at']
+    list_display = ['id', 'name', 'brand', 'barcode', 'price', 'quantity', 'unit', 'created_at']
     list_display_links = ['id', 'name']
-    search_fields = ['name', 'brand']
+    search_fields = ['name', 'brand', 'barcode']
     list_filter = ['unit', 'created_at']
     readonly_fields = ['created_at', 'updated_at']
     
     def get_queryset(self, request):
-        return super().get_queryset(request).order_by('-created_at')
\ No newline at end of file
+        return super().get_queryset(request).order_by('-created_at')
+
+    def delete_queryset(self, request, queryset):
+        # One by one so Product.delete() takes each product out of the inventory snapshot
+        with transaction.atomic():
+            for product in queryset:
+                product.delete()
+
+@admin.register(InventorySnapshot)
+class InventorySnapshotAdmin(admin.ModelAdmin):
+    list_display = ['product_count', 'total_quantity', 'total_value', 'price_sum', 'last_updated']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(ImportBatch)
+class ImportBatchAdmin(admin.ModelAdmin):
+    list_display = ['id', 'file_name', 'status', 'mode', 'total_rows', 'processed_rows', 'created_by', 'created_at', 'finished_at']
+    list_filter = ['status', 'mode']
+    readonly_fields = ['created_at', 'finished_at', 'heartbeat', 'applied_through']
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'total_rows', 'processed_rows', 'created_by', 'created_at', 'finished_at']
+    list_filter = ['status', 'kind']
+    readonly_fields = ['created_at', 'finished_at', 'heartbeat']
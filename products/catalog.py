@@ -0,0 +1,97 @@
+"""
+Compact, versioned product catalog for the sale form.
+
+The version is "<latest updated_at in microseconds>-<product count>".
+Every write to a product (save, checkout, import) bumps its updated_at,
+so the rows changed since a version are the ones with updated_at at or
+after it (less a few seconds, for writes that committed late). Deletions leave no row behind; they show up as a count that
+is lower than the old count plus the products created since, and the
+client is then sent the whole catalog again.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Count, Max
+
+from .models import Product
+
+# Row layout of the payload, so each product is a short array
+CATALOG_FIELDS = ['id', 'name', 'brand', 'unit', 'price', 'quantity']
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+# updated_at is set before the transaction commits, so a row can become
+# visible after a newer version was read; deltas re-send this much history
+DELTA_OVERLAP = timedelta(seconds=5)
+
+
+def encode_version(last_updated, count):
+    micros = (last_updated - _EPOCH) // _MICROSECOND if last_updated else 0
+    return f"{micros}-{count}"
+
+
+def decode_version(value):
+    """(updated_at, count) from a version string, or None if it is malformed"""
+    try:
+        micros, count = value.split('-')
+        micros, count = int(micros), int(count)
+    except (AttributeError, ValueError):
+        return None
+    if micros < 0 or count < 0:
+        return None
+    return _EPOCH + micros * _MICROSECOND, count
+
+
+def current_version():
+    """The catalog version, from one aggregate over the updated_at index"""
+    totals = Product.objects.aggregate(count=Count('id'), last_updated=Max('updated_at'))
+    return encode_version(totals['last_updated'], totals['count'])
+
+
+def catalog_rows(products):
+    return [
+        [product_id, name, brand, unit, str(price), str(quantity)]
+        for product_id, name, brand, unit, price, quantity in products.values_list(*CATALOG_FIELDS)
+    ]
+
+
+def changed_products(since, version):
+    """
+    Products changed after the since version, or None when that cannot be
+    told from updated_at (since is malformed, or products were deleted).
+    """
+    decoded = decode_version(since) if since else None
+    if decoded is None:
+        return None
+    if since == version:
+        return Product.objects.none()
+
+    since_updated, since_count = decoded
+    _, count = decode_version(version)
+    created = Product.objects.filter(created_at__gte=since_updated).count()
+    # Equal only if nothing was deleted since
+    if count != since_count + created:
+        return None
+    return Product.objects.filter(updated_at__gte=since_updated - DELTA_OVERLAP).order_by('id')
+
+
+def catalog_payload(since=None, version=None):
+    """
+    The catalog as {'version', 'full', 'fields', 'rows'}.
+
+    With a valid since version the rows are only the products changed
+    after it (out-of-stock ones included, so the client can drop them);
+    otherwise, or when products were deleted since, full is True and the
+    rows are every product in stock. version defaults to current_version().
+    """
+    if version is None:
+        version = current_version()
+    payload = {'version': version, 'full': True, 'fields': CATALOG_FIELDS}
+
+    changed = changed_products(since, version)
+    if changed is not None:
+        payload.update(full=False, rows=catalog_rows(changed))
+        return payload
+
+    payload['rows'] = catalog_rows(Product.objects.filter(quantity__gt=0).order_by('name'))
+    return payload
@@ -0,0 +1,141 @@
+"""
+On-disk cache of finished export files.
+
+An artifact is keyed by the export kind, its normalized filter parameters
+and the version of the data it was built from (row count, highest ID and
+latest updated_at of the filtered queryset). Any change to a matching row
+gives a new key, so stale files are never served; they just age out.
+EXPORT_FORMAT_VERSION is part of the key too: bump it whenever the
+columns or layout of an export change, so files in the old format are
+not served either.
+Files are evicted least recently used first once the directory grows past
+EXPORT_CACHE_MAX_BYTES.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+# Bump when export columns or layout change (2: barcode column)
+EXPORT_FORMAT_VERSION = 2
+
+
+class ExportArtifact:
+    def __init__(self, path, etag, last_modified):
+        self.path = path
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+def cache_dir():
+    path = Path(getattr(settings, 'EXPORT_CACHE_DIR', Path(settings.MEDIA_ROOT) / 'export_cache'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def data_version(queryset):
+    """Row count, highest ID and latest updated_at of the rows an export would contain"""
+    return queryset.order_by().aggregate(
+        count=Count('id'),
+        max_id=Max('id'),
+        last_updated=Max('updated_at'),
+    )
+
+
+def normalize_params(params, keys):
+    """The filter values that affect the export, with whitespace collapsed"""
+    return {key: ' '.join(params.get(key, '').split()) for key in keys}
+
+
+def cache_key(kind, params, version):
+    payload = json.dumps({
+        'format': EXPORT_FORMAT_VERSION,
+        'kind': kind,
+        'params': params,
+        'count': version['count'],
+        'max_id': version['max_id'],
+        'last_updated': version['last_updated'].isoformat() if version['last_updated'] else None,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def get_or_build(kind, params, queryset, build, suffix):
+    """
+    The cached artifact for this export, built with build(output) on a miss.
+
+    The file is written to a temporary name and renamed into place, so a
+    concurrent request never reads a half-written file.
+    """
+    version = data_version(queryset)
+    key = cache_key(kind, params, version)
+    path = cache_dir() / f"{key}{suffix}"
+
+    if path.exists():
+        # Mark as recently used for eviction
+        os.utime(path)
+    else:
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir(), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as output:
+                build(output)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        evict(keep=path)
+
+    last_modified = version['last_updated'] or datetime.fromtimestamp(path.stat().st_mtime, tz=dt_timezone.utc)
+    return ExportArtifact(path, f'"{key}"', last_modified)
+
+
+def evict(max_bytes=None, keep=None, directory=None):
+    """
+    Delete least recently used artifacts (except keep) until the cache fits
+    in max_bytes. directory defaults to the export cache.
+    """
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'EXPORT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+    if directory is None:
+        directory = cache_dir()
+
+    files = []
+    for path in directory.iterdir():
+        if path.suffix == '.tmp' or path == keep:
+            continue
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in files)
+    if keep is not None and keep.exists():
+        total += keep.stat().st_size
+    for _, size, path in sorted(files, key=lambda item: item[0]):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+
+
+def serve(request, artifact, filename, content_type):
+    """The artifact as a download, or 304 Not Modified when the client already has it"""
+    last_modified = int(artifact.last_modified.timestamp())
+    response = get_conditional_response(request, etag=artifact.etag, last_modified=last_modified)
+    if response is None:
+        response = FileResponse(open(artifact.path, 'rb'), as_attachment=True, filename=filename, content_type=content_type)
+    response['ETag'] = artifact.etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Private: each export depends on the user being logged in
+    response['Cache-Control'] = 'private, no-cache'
+    return response
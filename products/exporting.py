@@ -0,0 +1,163 @@
+"""
+Product exports, written row by row from a database cursor so memory
+stays flat as the catalog grows.
+
+XLSX is for people (labels, formatted dates); CSV and JSON lines are for
+integrations (field names, ISO dates, decimals as exact strings).
+"""
+import csv
+import json
+from itertools import islice
+
+import openpyxl
+from django.db.models import CharField, Max
+from django.db.models.functions import Cast, Length
+from openpyxl.utils import get_column_letter
+
+from .models import Product
+
+# Rows fetched per round trip while exporting
+EXPORT_CHUNK_SIZE = 2000
+
+# Lines joined into one chunk of a streaming response
+STREAM_BATCH_SIZE = 500
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+CSV_CONTENT_TYPE = 'text/csv; charset=utf-8'
+NDJSON_CONTENT_TYPE = 'application/x-ndjson; charset=utf-8'
+
+DATE_FORMAT = '%d.%m.%Y %H:%M'
+
+# (header, Product field) in export order
+PRODUCT_COLUMNS = [
+    ('ID', 'id'),
+    ('Nomi', 'name'),
+    ('Brend', 'brand'),
+    ('Shtrix-kod', 'barcode'),
+    ('Narx (so\'m)', 'price'),
+    ('Miqdor', 'quantity'),
+    ('O\'lchov birligi', 'unit'),
+    ('Yaratilgan sana', 'created_at'),
+    ('Yangilangan sana', 'updated_at'),
+]
+
+# Fields of the CSV / JSON lines product export
+PRODUCT_FIELDS = ['id', 'name', 'brand', 'barcode', 'price', 'quantity', 'unit', 'created_at', 'updated_at']
+
+
+def iter_product_rows(products, chunk_size=EXPORT_CHUNK_SIZE):
+    """Export rows as tuples, in PRODUCT_COLUMNS order, read with values_list in chunks"""
+    unit_labels = dict(Product.UNIT_CHOICES)
+    fields = [field for _, field in PRODUCT_COLUMNS]
+    rows = products.order_by('id').values_list(*fields).iterator(chunk_size=chunk_size)
+    for product_id, name, brand, barcode, price, quantity, unit, created_at, updated_at in rows:
+        yield (
+            product_id,
+            name,
+            brand,
+            barcode or '',
+            float(price),
+            float(quantity),
+            unit_labels.get(unit, unit),
+            created_at.strftime(DATE_FORMAT),
+            updated_at.strftime(DATE_FORMAT),
+        )
+
+
+def product_column_widths(products):
+    """
+    Column widths for the XLSX export, from one aggregate query.
+
+    Write-only sheets emit column widths before the first row, so the
+    longest value per column is measured in the database up front instead
+    of by scanning the finished sheet.
+    """
+    text_fields = ['id', 'name', 'brand', 'barcode', 'price', 'quantity']
+    lengths = products.aggregate(**{
+        field: Max(Length(Cast(field, CharField()))) for field in text_fields
+    })
+    lengths['unit'] = max(len(label) for _, label in Product.UNIT_CHOICES)
+    lengths['created_at'] = lengths['updated_at'] = len('01.01.2000 00:00')
+
+    return [
+        max(len(header), lengths[field] or 0) + 2
+        for header, field in PRODUCT_COLUMNS
+    ]
+
+
+def write_products_xlsx(products, output, rows=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Write products to output (a path or binary file) as a single-sheet
+    workbook. rows defaults to iter_product_rows(products).
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Mahsulotlar')
+
+    for position, width in enumerate(product_column_widths(products), start=1):
+        sheet.column_dimensions[get_column_letter(position)].width = width
+
+    sheet.append([header for header, _ in PRODUCT_COLUMNS])
+    if rows is None:
+        rows = iter_product_rows(products, chunk_size=chunk_size)
+    for row in rows:
+        sheet.append(row)
+
+    workbook.save(output)
+
+
+def to_plain(value):
+    """Decimals as exact strings and datetimes as ISO 8601, for CSV / JSON"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def iter_records(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """Plain values of the given fields, one tuple per row, read from a server-side cursor"""
+    rows = queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield tuple(to_plain(value) for value in row)
+
+
+def iter_product_records(products, chunk_size=EXPORT_CHUNK_SIZE):
+    return iter_records(products.order_by('id'), PRODUCT_FIELDS, chunk_size=chunk_size)
+
+
+class Echo:
+    """Pseudo-buffer for csv.writer: write() hands the formatted line back"""
+    def write(self, value):
+        return value
+
+
+def batched_lines(lines, batch_size=STREAM_BATCH_SIZE):
+    """Join lines into larger chunks so a streaming response is not one write per row"""
+    lines = iter(lines)
+    while True:
+        batch = ''.join(islice(lines, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_csv(header, records):
+    """CSV text chunks; the header goes out on its own so the first byte is sent at once"""
+    writer = csv.writer(Echo())
+    # BOM so Excel opens the UTF-8 file with the Uzbek letters intact
+    yield '\ufeff' + writer.writerow(header)
+    yield from batched_lines(writer.writerow(record) for record in records)
+
+
+def iter_ndjson(fields, records):
+    """JSON lines text chunks, one object per record"""
+    yield from batched_lines(
+        json.dumps(dict(zip(fields, record)), ensure_ascii=False) + '\n'
+        for record in records
+    )
+
+
+def write_text(chunks, output):
+    """Write text chunks (from iter_csv / iter_ndjson) to a binary file as UTF-8"""
+    for chunk in chunks:
+        output.write(chunk.encode('utf-8'))
@@ -0,0 +1,40 @@
+"""
+Query-string filters shared by the product list, statistics and exports.
+
+They take any mapping of parameters (usually request.GET), so background
+jobs can replay a saved filter without a request.
+"""
+from django.utils.dateparse import parse_date
+
+from .models import Product
+from .search import search_products
+
+
+def filter_products(params):
+    """Products matching the product list's search and unit filters"""
+    products = Product.objects.all()
+
+    search_query = params.get('search', '')
+    if search_query:
+        products = search_products(products, search_query)
+
+    unit_filter = params.get('unit', '')
+    if unit_filter:
+        products = products.filter(unit=unit_filter)
+
+    return products
+
+
+def parse_date_range(params):
+    """Read optional date_from / date_to (YYYY-MM-DD) from the parameters"""
+    try:
+        date_from = parse_date(params.get('date_from', ''))
+    except ValueError:
+        date_from = None
+    try:
+        date_to = parse_date(params.get('date_to', ''))
+    except ValueError:
+        date_to = None
+    if date_from and date_to and date_from > date_to:
+        date_from, date_to = date_to, date_from
+    return date_from, date_to
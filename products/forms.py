@@ -1,10 +1,10 @@
 from django import forms
-from .models import Product
+from .models import Product, normalize_barcode
 
 class ExcelImportForm(forms.Form):
     excel_file = forms.FileField(
         label='Excel fayl',
-        help_text='Quyidagi ustunlar boʻlgan Excel fayl: Nomi, Brend, Narx (so‘m), Dona/Miqdor, Oʻlchov birligi',
+        help_text='Quyidagi ustunlar boʻlgan Excel fayl: Nomi, Brend, Narx (so‘m), Dona/Miqdor, Oʻlchov birligi (Shtrix-kod ixtiyoriy)',
         widget=forms.FileInput(attrs={
             'class': 'w-full px-3 py-2 border border-border rounded-lg focus:outline-none focus:ring-2 focus:ring-accent focus:border-transparent file:mr-4 file:py-2 file:px-4 file:rounded-full file:border-0 file:text-sm file:font-semibold file:bg-accent file:text-accent-foreground hover:file:opacity-90',
             'accept': '.xlsx, .xls'
@@ -14,7 +14,7 @@ class ExcelImportForm(forms.Form):
 class ProductForm(forms.ModelForm):
     class Meta:
         model = Product
-        fields = ['name', 'brand', 'price', 'quantity', 'unit']
+        fields = ['name', 'brand', 'barcode', 'price', 'quantity', 'unit']
         widgets = {
             'name': forms.TextInput(attrs={
                 'class': 'w-full px-3 py-2 border border-border rounded-lg focus:outline-none focus:ring-2 focus:ring-accent focus:border-transparent',
@@ -24,6 +24,10 @@ class ProductForm(forms.ModelForm):
                 'class': 'w-full px-3 py-2 border border-border rounded-lg focus:outline-none focus:ring-2 focus:ring-accent focus:border-transparent',
                 'placeholder': 'Brend'
             }),
+            'barcode': forms.TextInput(attrs={
+                'class': 'w-full px-3 py-2 border border-border rounded-lg focus:outline-none focus:ring-2 focus:ring-accent focus:border-transparent',
+                'placeholder': 'Shtrix-kod yoki SKU (ixtiyoriy)'
+            }),
             'price': forms.NumberInput(attrs={
                 'class': 'w-full px-3 py-2 border border-border rounded-lg focus:outline-none focus:ring-2 focus:ring-accent focus:border-transparent',
                 'placeholder': 'Narx',
@@ -41,7 +45,15 @@ class ProductForm(forms.ModelForm):
         labels = {
             'name': 'Mahsulot nomi',
             'brand': 'Brend',
+            'barcode': 'Shtrix-kod',
             'price': 'Narx',
             'quantity': 'Miqdor',
             'unit': 'Oʻlchov birligi'
-        }
\ No newline at end of file
+        }
+        error_messages = {
+            'barcode': {'unique': "Bu shtrix-kod boshqa mahsulotda bor"},
+        }
+
+    def clean_barcode(self):
+        # Normalized here, not only in Product.save(), so the unique check sees the stored value
+        return normalize_barcode(self.cleaned_data.get('barcode'))
\ No newline at end of file
@@ -0,0 +1,491 @@
+"""
+Excel import pipeline: read the supplier sheet, normalize it and match
+rows against existing products.
+"""
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+import openpyxl
+import pandas as pd
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .models import Product, InventorySnapshot, ImportBatch, ImportRow, make_lookup_key, normalize_barcode
+
+# Column headers accepted in supplier files, mapped to Product fields
+COLUMN_MAPPING = {
+    'Nomi': 'name',
+    'Brend': 'brand',
+    'Narx (so‘m)': 'price',
+    'Narx': 'price',
+    "Narx (so'm)": 'price',
+    'Dona': 'quantity',
+    'Miqdor': 'quantity',
+    'O‘lchov birligi': 'unit',
+    'Oʻlchov birligi': 'unit',
+    "O'lchov birligi": 'unit',
+    'Shtrix-kod': 'barcode',
+    'Barcode': 'barcode',
+    'SKU': 'barcode',
+}
+
+REQUIRED_COLUMNS = ['name', 'brand', 'price', 'quantity', 'unit']
+
+# Read when the file has them; rows of files without them get None
+OPTIONAL_COLUMNS = ['barcode']
+
+UNIT_MAPPING = {
+    'kg': 'kg',
+    'dona': 'dona',
+    'metr': 'metr',
+    'kub': 'kub',
+    'litr': 'litr'
+}
+
+# Keys per IN (...) query, well below SQLite's bound-parameter limit
+LOOKUP_CHUNK_SIZE = 500
+
+# Rows per bulk_create / bulk_update in the apply step
+APPLY_CHUNK_SIZE = 500
+
+# Error messages kept in the results; the errors count stays exact
+ERROR_MESSAGES_LIMIT = 100
+
+# Apply modes: everything in one transaction, or each chunk on its own
+MODE_ATOMIC = 'atomic'
+MODE_BEST_EFFORT = 'best_effort'
+APPLY_MODES = (MODE_ATOMIC, MODE_BEST_EFFORT)
+
+TWO_PLACES = Decimal('0.01')
+
+
+class ImportRowError(ValueError):
+    """A staged row that cannot be applied"""
+
+
+class ImportAborted(Exception):
+    """Raised in atomic mode to roll back the whole import"""
+    def __init__(self, results):
+        self.results = results
+        super().__init__(results['error_messages'][0] if results['error_messages'] else 'Import bekor qilindi')
+
+
+class MissingColumnsError(ValueError):
+    def __init__(self, columns):
+        self.columns = columns
+        super().__init__(f'Quyidagi ustunlar topilmadi: {", ".join(columns)}')
+
+
+def iter_sheet_rows(excel_file):
+    """
+    Yield (excel_row_number, values) for each data row of the first sheet,
+    with values keyed by Product field names.
+
+    .xlsx files are read with openpyxl in read-only mode, one row at a
+    time; legacy .xls files fall back to pandas.
+    """
+    if getattr(excel_file, 'name', '').lower().endswith('.xls'):
+        yield from iter_xls_rows(excel_file)
+        return
+
+    workbook = openpyxl.load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, ())
+        positions = column_positions(header)
+        for row_number, values in enumerate(rows, start=2):
+            yield row_number, {
+                field: values[position] if position < len(values) else None
+                for field, position in positions.items()
+            }
+    finally:
+        workbook.close()
+
+
+def iter_xls_rows(excel_file):
+    df = pd.read_excel(excel_file)
+    positions = column_positions(list(df.columns))
+    for offset, values in enumerate(df.itertuples(index=False, name=None)):
+        yield offset + 2, {
+            field: None if pd.isna(values[position]) else values[position]
+            for field, position in positions.items()
+        }
+
+
+def column_positions(header):
+    """Map Product field -> column position from a header row"""
+    positions = {}
+    for position, title in enumerate(header):
+        field = COLUMN_MAPPING.get(title, title)
+        if (field in REQUIRED_COLUMNS or field in OPTIONAL_COLUMNS) and field not in positions:
+            positions[field] = position
+
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in positions]
+    if missing_columns:
+        raise MissingColumnsError(missing_columns)
+    return positions
+
+
+def to_float(value):
+    # Empty price/quantity cells are rejected later, when the row is applied
+    return float('nan') if value is None else float(value)
+
+
+def normalize_rows(rows):
+    """Streaming stage: skip empty/header-like rows, clean values, add lookup_key"""
+    for index, row in rows:
+        name, brand = row['name'], row['brand']
+        # Skip empty rows or header-like rows
+        if name is None or brand is None or name == 'Nomi' or brand == 'Brend':
+            continue
+
+        name = str(name).strip()
+        brand = str(brand).strip()
+        yield {
+            'index': index,
+            'name': name,
+            'brand': brand,
+            'price': to_float(row['price']),
+            'quantity': to_float(row['quantity']),
+            # Unknown units default to 'dona'
+            'unit': UNIT_MAPPING.get(str(row['unit']).strip().lower(), 'dona'),
+            'barcode': normalize_barcode(row.get('barcode')),
+            'lookup_key': make_lookup_key(name, brand),
+        }
+
+
+def fetch_existing(lookup_keys, chunk_size=LOOKUP_CHUNK_SIZE):
+    """Existing products by lookup_key, in chunked IN queries"""
+    lookup_keys = list(lookup_keys)
+    existing = {}
+    for start in range(0, len(lookup_keys), chunk_size):
+        chunk = lookup_keys[start:start + chunk_size]
+        products = (
+            Product.objects.filter(lookup_key__in=chunk)
+            .order_by('id')
+            .values('lookup_key', 'id', 'name', 'brand', 'price', 'quantity', 'unit')
+        )
+        for product in products:
+            # With forced duplicates, the oldest product wins (as Product.find_duplicate)
+            existing.setdefault(product.pop('lookup_key'), product)
+    return existing
+
+
+def resolve_rows(rows, batch_size=LOOKUP_CHUNK_SIZE):
+    """Streaming stage: match each batch of rows against existing products in one IN query"""
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+
+        existing = fetch_existing({row['lookup_key'] for row in batch}, chunk_size=batch_size)
+        for row in batch:
+            product = existing.get(row.pop('lookup_key'))
+            row['existing_product'] = None
+            row['action'] = 'create'
+            if product:
+                row['existing_product'] = {
+                    'id': product['id'],
+                    'name': product['name'],
+                    'brand': product['brand'],
+                    'price': float(product['price']),
+                    'quantity': float(product['quantity']),
+                    'unit': product['unit']
+                }
+                row['action'] = 'update'
+            yield row
+
+
+def iter_preview(excel_file, start_after=0):
+    """
+    Preview rows of an uploaded Excel file, produced one at a time.
+
+    Sheet rows up to start_after (an Excel row number) are skipped before
+    they are normalized or matched.
+    """
+    rows = iter_sheet_rows(excel_file)
+    if start_after:
+        rows = ((index, row) for index, row in rows if index > start_after)
+    return resolve_rows(normalize_rows(rows))
+
+
+def stage_rows(batch, chunk_size=APPLY_CHUNK_SIZE):
+    """
+    Stream the batch's uploaded file into ImportRow.
+
+    Each chunk is written with bulk_create and committed together with the
+    batch counters, so a run that dies halfway resumes after the last
+    staged row instead of starting over.
+    """
+    start_after = batch.rows.aggregate(last=Max('row_number'))['last'] or 0
+    with batch.file.open('rb') as excel_file:
+        rows = iter_preview(excel_file, start_after=start_after)
+        while True:
+            chunk = [ImportRow.from_preview(batch, row) for row in islice(rows, chunk_size)]
+            if not chunk:
+                break
+            with transaction.atomic():
+                ImportRow.objects.bulk_create(chunk)
+                ImportBatch.objects.filter(pk=batch.pk).update(
+                    total_rows=F('total_rows') + len(chunk),
+                    update_rows=F('update_rows') + sum(1 for row in chunk if row.action == 'update'),
+                    heartbeat=timezone.now(),
+                )
+
+    ImportBatch.objects.filter(pk=batch.pk).update(new_rows=F('total_rows') - F('update_rows'))
+    batch.refresh_from_db()
+    return batch
+
+
+def iter_batch_rows(batch, after_id=0, chunk_size=APPLY_CHUNK_SIZE):
+    """Staged rows of a batch as preview dicts, read from the database in chunks"""
+    rows = batch.rows.filter(id__gt=after_id).order_by('id')
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield row.to_preview()
+
+
+def to_decimal(value, max_digits=10):
+    """Round to two places and check it fits a DecimalField(max_digits, 2)"""
+    try:
+        number = Decimal(str(value)).quantize(TWO_PLACES)
+    except (InvalidOperation, ValueError, TypeError):
+        raise ImportRowError(f"Noto'g'ri son: {value}")
+    if not number.is_finite() or abs(number) >= Decimal(10) ** (max_digits - 2):
+        raise ImportRowError(f"Noto'g'ri son: {value}")
+    return number
+
+
+def clean_row(product_data):
+    """Validated price/quantity/unit of a preview row"""
+    unit = product_data['unit']
+    if unit not in UNIT_MAPPING.values():
+        raise ImportRowError(f"Noto'g'ri o'lchov birligi: {unit}")
+    return to_decimal(product_data['price']), to_decimal(product_data['quantity']), unit
+
+
+def row_error(product_data, error):
+    return f"Qator {product_data['index']}: {product_data['name']} - {str(error)}"
+
+
+def barcode_owners(barcodes):
+    """Product ID per barcode already in use, from one query on the unique index"""
+    barcodes = [barcode for barcode in barcodes if barcode]
+    if not barcodes:
+        return {}
+    return dict(Product.objects.filter(barcode__in=barcodes).values_list('barcode', 'id'))
+
+
+def apply_chunk(rows):
+    """
+    Write one chunk: a bulk_create for new products and a bulk_update with
+    F() quantity increments for existing ones, plus the matching snapshot
+    delta. Must run inside a transaction.
+    """
+    result = {'created': 0, 'updated': 0, 'errors': 0, 'error_messages': []}
+    now = timezone.now()
+    creates = {}
+    updates = {}
+    # Barcode -> the product (or new row) that has it, so a code is never given to two products
+    owners = barcode_owners({product_data.get('barcode') for product_data in rows})
+    # Products created since the preview was matched (by an earlier chunk of this
+    # file, or by someone else): their rows become updates instead of duplicates
+    created_since = fetch_existing({
+        make_lookup_key(product_data['name'], product_data['brand'])
+        for product_data in rows if product_data['action'] == 'create'
+    })
+
+    for product_data in rows:
+        try:
+            price, quantity, unit = clean_row(product_data)
+        except ImportRowError as e:
+            result['errors'] += 1
+            result['error_messages'].append(row_error(product_data, e))
+            continue
+
+        existing = product_data['existing_product']
+        lookup_key = None
+        if product_data['action'] == 'create':
+            lookup_key = make_lookup_key(product_data['name'], product_data['brand'])
+            existing = created_since.get(lookup_key)
+
+        if product_data['action'] == 'update' and not existing:
+            # The matched product was deleted after the preview
+            result['errors'] += 1
+            result['error_messages'].append(row_error(product_data, 'Mahsulot topilmadi'))
+            continue
+
+        barcode = product_data.get('barcode')
+        if barcode:
+            target = existing['id'] if existing else lookup_key
+            owner = owners.setdefault(barcode, target)
+            if owner != target:
+                result['errors'] += 1
+                result['error_messages'].append(row_error(product_data, f"Shtrix-kod {barcode} boshqa mahsulotda bor"))
+                continue
+
+        # The same product twice in one chunk: quantities add up, the last price/unit/barcode wins
+        if existing:
+            product_id = existing['id']
+            rows_for_product = 1
+            if product_id in updates:
+                _, _, previous_quantity, _, previous_barcode, rows_for_product = updates[product_id]
+                quantity += previous_quantity
+                barcode = barcode or previous_barcode
+                rows_for_product += 1
+            updates[product_id] = (product_data, price, quantity, unit, barcode, rows_for_product)
+        else:
+            rows_for_product = 1
+            if lookup_key in creates:
+                _, _, previous_quantity, _, previous_barcode, rows_for_product = creates[lookup_key]
+                quantity += previous_quantity
+                barcode = barcode or previous_barcode
+                rows_for_product += 1
+            creates[lookup_key] = (product_data, price, quantity, unit, barcode, rows_for_product)
+
+    new_products = [
+        Product(
+            name=product_data['name'].strip(),
+            brand=product_data['brand'].strip(),
+            price=price,
+            quantity=quantity,
+            unit=unit,
+            barcode=barcode,
+            lookup_key=lookup_key,
+        )
+        for lookup_key, (product_data, price, quantity, unit, barcode, _) in creates.items()
+    ]
+    if new_products:
+        Product.objects.bulk_create(new_products)
+        result['created'] = sum(rows_for_product for *_, rows_for_product in creates.values())
+        InventorySnapshot.apply_delta(
+            count=len(new_products),
+            quantity=sum(p.quantity for p in new_products),
+            value=sum(p.price * p.quantity for p in new_products),
+            price=sum(p.price for p in new_products),
+        )
+
+    if updates:
+        # Current values, locked by the surrounding transaction, for the snapshot delta
+        current = {
+            row['id']: row
+            for row in Product.objects.filter(id__in=list(updates)).values('id', 'price', 'quantity')
+        }
+        changed = []
+        updated_rows = 0
+        quantity_delta = value_delta = price_delta = Decimal('0')
+        for product_id, (product_data, price, quantity, unit, barcode, rows_for_product) in updates.items():
+            old = current.get(product_id)
+            if old is None:
+                result['errors'] += rows_for_product
+                result['error_messages'].append(row_error(product_data, 'Mahsulot topilmadi'))
+                continue
+            changed.append(Product(
+                id=product_id,
+                price=price,
+                quantity=F('quantity') + quantity,
+                unit=unit,
+                # A row without a barcode keeps the product's current one
+                barcode=barcode or F('barcode'),
+                updated_at=now,
+            ))
+            updated_rows += rows_for_product
+            quantity_delta += quantity
+            value_delta += price * (old['quantity'] + quantity) - old['price'] * old['quantity']
+            price_delta += price - old['price']
+
+        if changed:
+            Product.objects.bulk_update(changed, ['price', 'quantity', 'unit', 'barcode', 'updated_at'])
+            result['updated'] = updated_rows
+            InventorySnapshot.apply_delta(quantity=quantity_delta, value=value_delta, price=price_delta)
+
+    return result
+
+
+def apply_rows_one_by_one(rows):
+    """Fallback for a failed best-effort chunk: isolate the rows that break it"""
+    result = {'created': 0, 'updated': 0, 'errors': 0, 'error_messages': []}
+    for product_data in rows:
+        try:
+            with transaction.atomic():
+                row_result = apply_chunk([product_data])
+        except Exception as e:
+            row_result = {'created': 0, 'updated': 0, 'errors': 1, 'error_messages': [row_error(product_data, e)]}
+        for key in ('created', 'updated', 'errors'):
+            result[key] += row_result[key]
+        result['error_messages'].extend(row_result['error_messages'])
+    return result
+
+
+def empty_results():
+    return {'created': 0, 'updated': 0, 'errors': 0, 'error_messages': [], 'chunks': []}
+
+
+def add_chunk_result(results, rows, chunk_result):
+    """New running totals with one more chunk; results itself is left as it was"""
+    chunks = results['chunks']
+    return {
+        'created': results['created'] + chunk_result['created'],
+        'updated': results['updated'] + chunk_result['updated'],
+        'errors': results['errors'] + chunk_result['errors'],
+        'error_messages': (results['error_messages'] + chunk_result['error_messages'])[:ERROR_MESSAGES_LIMIT],
+        'chunks': chunks + [{
+            'chunk': len(chunks) + 1,
+            'first_row': rows[0]['index'],
+            'last_row': rows[-1]['index'],
+            'created': chunk_result['created'],
+            'updated': chunk_result['updated'],
+            'errors': chunk_result['errors'],
+        }],
+    }
+
+
+def apply_import(products_data, mode=MODE_ATOMIC, chunk_size=APPLY_CHUNK_SIZE, results=None, on_chunk=None):
+    """
+    Apply preview rows (any iterable) in chunks.
+
+    MODE_ATOMIC runs every chunk in one transaction and raises
+    ImportAborted (after rolling back) on the first bad row.
+    MODE_BEST_EFFORT commits chunk by chunk; a chunk that fails is retried
+    row by row so only the broken rows are skipped.
+
+    on_chunk(rows, results) is called inside each chunk's transaction with
+    the running totals, so progress saved there commits (or rolls back)
+    with the chunk. Pass the last saved results back in to resume.
+    """
+    results = results or empty_results()
+
+    def chunks():
+        rows = iter(products_data)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    if mode == MODE_ATOMIC:
+        with transaction.atomic():
+            for rows in chunks():
+                chunk_result = apply_chunk(rows)
+                results = add_chunk_result(results, rows, chunk_result)
+                if chunk_result['errors']:
+                    raise ImportAborted(results)
+                if on_chunk:
+                    on_chunk(rows, results)
+        return results
+
+    for rows in chunks():
+        try:
+            with transaction.atomic():
+                chunk_results = add_chunk_result(results, rows, apply_chunk(rows))
+                if on_chunk:
+                    on_chunk(rows, chunk_results)
+        except Exception:
+            # Savepoint per row inside one transaction, so the progress still commits with the chunk
+            with transaction.atomic():
+                chunk_results = add_chunk_result(results, rows, apply_rows_one_by_one(rows))
+                if on_chunk:
+                    on_chunk(rows, chunk_results)
+        results = chunk_results
+    return results
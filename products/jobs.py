@@ -0,0 +1,392 @@
+"""
+Background import and export jobs.
+
+An ImportBatch doubles as the job record. The upload view saves the file
+and queues the batch; a worker claims it by switching it to a running
+status, stages or applies its rows chunk by chunk and commits progress
+with every chunk. Workers run in a thread of the web process, started once
+the request has committed, or through the run_import_jobs management
+command. A running job whose heartbeat stops (the process died) is claimed
+again and resumes after its last committed chunk.
+
+ExportJob works the same way on its own queue (run_export_jobs), with a
+limit on how many exports run at once. An export that dies is simply
+written again from the start.
+"""
+import os
+import threading
+import traceback
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .exporting import (
+    iter_product_rows, iter_product_records, write_products_xlsx, write_text, iter_csv, iter_ndjson,
+    PRODUCT_FIELDS,
+)
+from .filters import filter_products
+from .importing import stage_rows, iter_batch_rows, apply_import, ImportAborted, MODE_ATOMIC
+from .models import ImportBatch, ExportJob
+
+# Queued status -> the running status a worker moves it to
+RUNNING_STATUS = {
+    'queued': 'parsing',
+    'apply_queued': 'applying',
+}
+
+# A running job without a heartbeat for this long is treated as crashed.
+# An atomic apply cannot save a heartbeat until it commits, so keep this generous.
+STALE_AFTER = timedelta(minutes=10)
+
+# Export rows written between heartbeat / progress saves
+EXPORT_PROGRESS_EVERY = 5000
+
+# Download names by the first part of ExportJob.kind
+EXPORT_FILE_NAMES = {
+    'products': 'mahsulotlar',
+    'sales': 'sotuvlar',
+}
+
+_worker_lock = threading.Lock()
+# Queue name -> its worker thread in this process
+_workers = {}
+_wakeups = set()
+
+
+def enqueue_parse(excel_file, user=None):
+    """Save an uploaded file on a new batch and queue it to be read into staged rows"""
+    batch = ImportBatch(
+        created_by=user,
+        file_name=getattr(excel_file, 'name', '')[:255],
+        status='queued',
+    )
+    batch.file.save(batch.file_name or 'import.xlsx', excel_file, save=False)
+    batch.save()
+    transaction.on_commit(lambda: start_worker('imports'))
+    return batch
+
+
+def enqueue_apply(batch, mode=MODE_ATOMIC):
+    """Queue a staged batch to be applied; False if it is not staged (any more)"""
+    queued = ImportBatch.objects.filter(pk=batch.pk, status='staged').update(
+        status='apply_queued',
+        mode=mode,
+        processed_rows=0,
+        applied_through=0,
+        results=None,
+        error='',
+    )
+    if queued:
+        transaction.on_commit(lambda: start_worker('imports'))
+    return bool(queued)
+
+
+def discard_batches(batches):
+    """Delete batches together with their uploaded files"""
+    for batch in batches:
+        if batch.file:
+            batch.file.delete(save=False)
+        batch.delete()
+
+
+def is_stale(batch):
+    return (
+        batch.status in RUNNING_STATUS.values()
+        and (batch.heartbeat is None or batch.heartbeat < timezone.now() - STALE_AFTER)
+    )
+
+
+def claim_next_job():
+    """
+    Move the oldest queued (or crashed) batch to its running status and
+    return it, or None when there is nothing to do.
+
+    The claim is a conditional UPDATE, so two workers never get the same job.
+    """
+    now = timezone.now()
+    candidates = (
+        ImportBatch.objects
+        .filter(
+            Q(status__in=RUNNING_STATUS)
+            | Q(status__in=RUNNING_STATUS.values(), heartbeat__lt=now - STALE_AFTER)
+        )
+        .order_by('id')
+        .values('id', 'status', 'heartbeat')[:10]
+    )
+    for candidate in candidates:
+        claimed = ImportBatch.objects.filter(
+            id=candidate['id'],
+            status=candidate['status'],
+            heartbeat=candidate['heartbeat'],
+        ).update(
+            status=RUNNING_STATUS.get(candidate['status'], candidate['status']),
+            heartbeat=now,
+        )
+        if claimed:
+            return ImportBatch.objects.get(id=candidate['id'])
+    return None
+
+
+def parse_job(batch):
+    stage_rows(batch)
+    if batch.file:
+        batch.file.delete(save=False)
+    ImportBatch.objects.filter(pk=batch.pk).update(status='staged', file='', heartbeat=timezone.now())
+
+
+def apply_job(batch):
+    def save_progress(rows, results):
+        # Runs inside the chunk's transaction
+        ImportBatch.objects.filter(pk=batch.pk).update(
+            applied_through=rows[-1]['row_id'],
+            processed_rows=F('processed_rows') + len(rows),
+            results=results,
+            heartbeat=timezone.now(),
+        )
+
+    # An atomic import that died rolled back its progress too, so it starts over
+    resume = batch.applied_through and batch.mode != MODE_ATOMIC
+    try:
+        results = apply_import(
+            iter_batch_rows(batch, after_id=batch.applied_through if resume else 0),
+            mode=batch.mode,
+            results=batch.results if resume else None,
+            on_chunk=save_progress,
+        )
+    except ImportAborted as e:
+        # Nothing was written; the batch goes back to staged so the import can be retried
+        ImportBatch.objects.filter(pk=batch.pk).update(
+            status='staged',
+            processed_rows=0,
+            applied_through=0,
+            results=e.results,
+            error=f"Import bekor qilindi, hech narsa saqlanmadi. {e}",
+            heartbeat=timezone.now(),
+        )
+        return
+
+    # Keep the outcome on the batch, drop the staged rows
+    ImportBatch.objects.filter(pk=batch.pk).update(
+        status='applied',
+        results=results,
+        finished_at=timezone.now(),
+    )
+    batch.rows.all().delete()
+
+
+def run_job(batch):
+    try:
+        if batch.status == 'parsing':
+            parse_job(batch)
+        else:
+            apply_job(batch)
+    except Exception as e:
+        traceback.print_exc()
+        ImportBatch.objects.filter(pk=batch.pk).update(
+            status='failed',
+            error=str(e),
+            finished_at=timezone.now(),
+        )
+
+
+def run_pending_jobs():
+    """Run jobs until none are left; returns how many were run"""
+    count = 0
+    while True:
+        batch = claim_next_job()
+        if batch is None:
+            return count
+        run_job(batch)
+        count += 1
+
+
+def export_limits():
+    return (
+        getattr(settings, 'EXPORT_JOBS_MAX_RUNNING', 2),
+        getattr(settings, 'EXPORT_JOBS_MAX_QUEUED_PER_USER', 5),
+        timedelta(days=getattr(settings, 'EXPORT_FILES_KEEP_DAYS', 7)),
+    )
+
+
+def export_file_name(job):
+    prefix, extension = job.kind.rsplit('_', 1)
+    return f"{EXPORT_FILE_NAMES[prefix]}.{extension}"
+
+
+def can_enqueue_export(user):
+    """False when the user already has the maximum number of unfinished exports"""
+    _, max_queued, _ = export_limits()
+    return ExportJob.objects.filter(created_by=user, status__in=['queued', 'running']).count() < max_queued
+
+
+def enqueue_export(kind, params, user=None):
+    job = ExportJob.objects.create(created_by=user, kind=kind, params=params)
+    transaction.on_commit(lambda: start_worker('exports'))
+    return job
+
+
+def is_export_stale(job):
+    return job.status == 'running' and (job.heartbeat is None or job.heartbeat < timezone.now() - STALE_AFTER)
+
+
+def claim_next_export():
+    """
+    Claim the oldest queued (or crashed) export, or None when there is
+    nothing to do or EXPORT_JOBS_MAX_RUNNING exports are already running.
+    """
+    max_running, _, _ = export_limits()
+    now = timezone.now()
+    running = ExportJob.objects.filter(status='running', heartbeat__gte=now - STALE_AFTER).count()
+    if running >= max_running:
+        return None
+
+    candidates = (
+        ExportJob.objects
+        .filter(Q(status='queued') | Q(status='running', heartbeat__lt=now - STALE_AFTER))
+        .order_by('id')
+        .values('id', 'status', 'heartbeat')[:10]
+    )
+    for candidate in candidates:
+        claimed = ExportJob.objects.filter(
+            id=candidate['id'],
+            status=candidate['status'],
+            heartbeat=candidate['heartbeat'],
+        ).update(status='running', heartbeat=now, processed_rows=0)
+        if claimed:
+            return ExportJob.objects.get(id=candidate['id'])
+    return None
+
+
+def track_progress(job, rows):
+    """Pass rows through, saving progress and a heartbeat every EXPORT_PROGRESS_EVERY rows"""
+    count = 0
+    for row in rows:
+        yield row
+        count += 1
+        if count % EXPORT_PROGRESS_EVERY == 0:
+            ExportJob.objects.filter(pk=job.pk).update(processed_rows=count, heartbeat=timezone.now())
+
+
+def write_export(job, output):
+    """Write the job's export to a binary file"""
+    prefix, extension = job.kind.rsplit('_', 1)
+    if prefix == 'products':
+        queryset = filter_products(job.params)
+        fields, records = PRODUCT_FIELDS, iter_product_records(queryset)
+    else:
+        # The sell app builds on products, so it is imported only when needed
+        from sell.exporting import iter_sale_records, SALE_FIELDS
+        from sell.filters import filter_sales
+        queryset = filter_sales(job.params)
+        fields, records = SALE_FIELDS, iter_sale_records(queryset)
+
+    ExportJob.objects.filter(pk=job.pk).update(total_rows=queryset.count())
+
+    if extension == 'xlsx':
+        write_products_xlsx(queryset, output, rows=track_progress(job, iter_product_rows(queryset)))
+    elif extension == 'csv':
+        write_text(iter_csv(fields, track_progress(job, records)), output)
+    else:
+        write_text(iter_ndjson(fields, track_progress(job, records)), output)
+
+
+def run_export(job):
+    storage = job.file.storage
+    name = f"exports/{job.kind}-{job.id}-{timezone.now():%Y%m%d%H%M%S}.{job.kind.rsplit('_', 1)[1]}"
+    path = Path(storage.path(name))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + '.tmp')
+
+    try:
+        with open(tmp_path, 'wb') as output:
+            write_export(job, output)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        traceback.print_exc()
+        tmp_path.unlink(missing_ok=True)
+        ExportJob.objects.filter(pk=job.pk).update(status='failed', error=str(e), finished_at=timezone.now())
+        return
+
+    ExportJob.objects.filter(pk=job.pk).update(
+        status='done',
+        file=name,
+        processed_rows=F('total_rows'),
+        finished_at=timezone.now(),
+    )
+
+
+def cleanup_exports():
+    """Delete finished exports (and their files) older than EXPORT_FILES_KEEP_DAYS"""
+    _, _, keep = export_limits()
+    old_jobs = ExportJob.objects.filter(status__in=['done', 'failed'], finished_at__lt=timezone.now() - keep)
+    count = 0
+    for job in old_jobs.iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        count += 1
+
+    # Half-written files of exports whose worker died
+    export_dir = Path(ExportJob._meta.get_field('file').storage.path('exports'))
+    if export_dir.exists():
+        stale = (timezone.now() - STALE_AFTER).timestamp()
+        for tmp_path in export_dir.glob('*.tmp'):
+            if tmp_path.stat().st_mtime < stale:
+                tmp_path.unlink(missing_ok=True)
+    return count
+
+
+def run_pending_exports():
+    """Run exports until none can be claimed; returns how many were run"""
+    cleanup_exports()
+    count = 0
+    while True:
+        job = claim_next_export()
+        if job is None:
+            return count
+        run_export(job)
+        count += 1
+
+
+QUEUES = {
+    'imports': run_pending_jobs,
+    'exports': run_pending_exports,
+}
+
+
+def start_worker(queue='imports'):
+    """
+    Drain a job queue in a daemon thread of this process.
+
+    At most one worker thread per queue runs per process; calling this
+    while it is busy makes it look for new jobs once more before it exits.
+    """
+    if not getattr(settings, 'BACKGROUND_JOBS_IN_PROCESS', True):
+        return
+    with _worker_lock:
+        _wakeups.add(queue)
+        if queue not in _workers:
+            _workers[queue] = threading.Thread(
+                target=_worker_loop, args=(queue,), name=f'{queue}-jobs', daemon=True
+            )
+            _workers[queue].start()
+
+
+def _worker_loop(queue):
+    try:
+        while True:
+            with _worker_lock:
+                if queue not in _wakeups:
+                    del _workers[queue]
+                    return
+                _wakeups.discard(queue)
+            try:
+                QUEUES[queue]()
+            except Exception:
+                traceback.print_exc()
+    finally:
+        connection.close()
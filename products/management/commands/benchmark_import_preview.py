@@ -0,0 +1,71 @@
+import time
+import tracemalloc
+from io import BytesIO
+
+import pandas as pd
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from products.importing import iter_preview
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Time the streaming Excel import preview (read, normalize, match) for generated files"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            nargs='+',
+            default=[1000, 10000, 50000],
+            help="Row counts of the generated files",
+        )
+
+    def make_workbook(self, rows):
+        """Supplier-style sheet where every other row matches an existing product"""
+        existing = list(Product.objects.values_list('name', 'brand')[:1000]) or [('Mahsulot', 'Brend')]
+        data = []
+        for i in range(rows):
+            if i % 2 == 0:
+                name, brand = existing[i % len(existing)]
+                name = name.upper()
+            else:
+                name, brand = f'Yangi mahsulot {i}', f'Brend {i % 50}'
+            data.append({
+                'Nomi': name,
+                'Brend': brand,
+                'Narx': 1000 + i % 500,
+                'Miqdor': 1 + i % 20,
+                'Oʻlchov birligi': 'Dona',
+            })
+        buffer = BytesIO()
+        pd.DataFrame(data).to_excel(buffer, index=False)
+        buffer.seek(0)
+        return buffer
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'rows':>8} {'time':>8} {'rows/s':>8} {'peak MB':>8} {'queries':>8}")
+        for rows in options['rows']:
+            workbook = self.make_workbook(rows)
+            workbook.name = 'benchmark.xlsx'
+
+            # Timed run; rows are consumed without being kept, to measure the reader itself
+            started = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                count = sum(1 for _ in iter_preview(workbook))
+            elapsed = time.perf_counter() - started
+
+            # Separate run for peak memory, since tracing allocations slows everything down
+            workbook.seek(0)
+            tracemalloc.start()
+            for _ in iter_preview(workbook):
+                pass
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            self.stdout.write(
+                f"{count:>8} {elapsed:>7.2f}s {count / elapsed:>8.0f} "
+                f"{peak / (1024 * 1024):>8.1f} {len(queries):>8}"
+            )
@@ -0,0 +1,43 @@
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from products.models import InventorySnapshot
+
+
+class Command(BaseCommand):
+    help = "Rebuild the inventory KPI snapshot from the Product table and report drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Only compare the stored snapshot with fresh totals, do not rewrite it",
+        )
+
+    def handle(self, *args, **options):
+        fresh = InventorySnapshot.compute()
+        stored = InventorySnapshot.objects.filter(pk=InventorySnapshot.SNAPSHOT_ID).first()
+
+        drift = []
+        if stored is None:
+            drift.append("snapshot row is missing")
+        else:
+            for field in ('product_count', 'total_quantity', 'total_value', 'price_sum'):
+                stored_value = Decimal(str(getattr(stored, field)))
+                fresh_value = Decimal(str(fresh[field]))
+                # SQLite keeps decimals as floating point, so allow rounding noise
+                if abs(stored_value - fresh_value) > Decimal('0.01'):
+                    drift.append(f"{field}: stored {stored_value}, actual {fresh_value}")
+
+        for line in drift:
+            self.stdout.write(self.style.WARNING(f"Drift: {line}"))
+
+        if options['check']:
+            if not drift:
+                self.stdout.write(self.style.SUCCESS("Snapshot is up to date"))
+            return
+
+        snapshot = InventorySnapshot.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Snapshot rebuilt: {snapshot.product_count} products, "
+            f"quantity {snapshot.total_quantity}, value {snapshot.total_value}"
+        ))
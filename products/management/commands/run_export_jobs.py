@@ -0,0 +1,40 @@
+import time
+from django.core.management.base import BaseCommand
+from products.jobs import run_pending_exports, cleanup_exports
+
+
+class Command(BaseCommand):
+    help = "Run queued background exports and delete expired export files"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help="Keep polling for new jobs instead of exiting when the queue is empty",
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help="Seconds to wait between polls with --loop (default: 2)",
+        )
+        parser.add_argument(
+            '--cleanup',
+            action='store_true',
+            help="Only delete expired exports and their files",
+        )
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            self.stdout.write(self.style.SUCCESS(f"Deleted {cleanup_exports()} expired export(s)"))
+            return
+
+        while True:
+            count = run_pending_exports()
+            if count:
+                self.stdout.write(self.style.SUCCESS(f"Ran {count} export job(s)"))
+            if not options['loop']:
+                if not count:
+                    self.stdout.write("No pending export jobs")
+                return
+            time.sleep(options['interval'])
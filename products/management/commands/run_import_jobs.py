@@ -0,0 +1,31 @@
+import time
+from django.core.management.base import BaseCommand
+from products.jobs import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background imports, and resume crashed ones from their last committed chunk"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help="Keep polling for new jobs instead of exiting when the queue is empty",
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help="Seconds to wait between polls with --loop (default: 2)",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            count = run_pending_jobs()
+            if count:
+                self.stdout.write(self.style.SUCCESS(f"Ran {count} import job(s)"))
+            if not options['loop']:
+                if not count:
+                    self.stdout.write("No pending import jobs")
+                return
+            time.sleep(options['interval'])
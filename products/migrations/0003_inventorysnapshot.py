@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:52
+
+from django.db import migrations, models
+from django.db.models import Count, F, Max, Sum
+
+
+def build_snapshot(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    InventorySnapshot = apps.get_model('products', 'InventorySnapshot')
+    totals = Product.objects.aggregate(
+        product_count=Count('id'),
+        total_quantity=Sum('quantity'),
+        total_value=Sum(F('price') * F('quantity')),
+        price_sum=Sum('price'),
+        last_updated=Max('updated_at'),
+    )
+    InventorySnapshot.objects.create(
+        pk=1,
+        product_count=totals['product_count'],
+        total_quantity=totals['total_quantity'] or 0,
+        total_value=totals['total_value'] or 0,
+        price_sum=totals['price_sum'] or 0,
+        last_updated=totals['last_updated'],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_alter_product_unique_together'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventorySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_count', models.IntegerField(default=0, verbose_name='Mahsulotlar soni')),
+                ('total_quantity', models.DecimalField(decimal_places=2, default=0, max_digits=20, verbose_name='Jami miqdor')),
+                ('total_value', models.DecimalField(decimal_places=4, default=0, max_digits=24, verbose_name='Jami qiymat')),
+                ('price_sum', models.DecimalField(decimal_places=2, default=0, max_digits=20, verbose_name="Narxlar yig'indisi")),
+                ('last_updated', models.DateTimeField(blank=True, null=True, verbose_name='Oxirgi yangilanish')),
+            ],
+            options={
+                'verbose_name': 'Ombor holati',
+                'verbose_name_plural': 'Ombor holati',
+            },
+        ),
+        migrations.RunPython(build_snapshot, migrations.RunPython.noop),
+    ]
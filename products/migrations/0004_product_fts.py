@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from products.search import install_fts, uninstall_fts
+
+
+def create_fts(apps, schema_editor):
+    install_fts(schema_editor)
+
+
+def drop_fts(apps, schema_editor):
+    uninstall_fts(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_inventorysnapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
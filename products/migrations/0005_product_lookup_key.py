@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:54
+
+from django.db import migrations, models
+
+from products.models import make_lookup_key
+from products.search import install_fts
+
+
+def backfill_lookup_key(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    batch = []
+    for product in Product.objects.only('id', 'name', 'brand').iterator(chunk_size=2000):
+        product.lookup_key = make_lookup_key(product.name, product.brand)
+        batch.append(product)
+        if len(batch) >= 2000:
+            Product.objects.bulk_update(batch, ['lookup_key'])
+            batch = []
+    if batch:
+        Product.objects.bulk_update(batch, ['lookup_key'])
+
+
+def restore_fts(apps, schema_editor):
+    # Adding the column rebuilds products_product on SQLite, which drops the FTS triggers
+    install_fts(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_fts'),
+    ]
+
+    operations = [
+        # On reverse, removing the column rebuilds the table again
+        migrations.RunPython(migrations.RunPython.noop, restore_fts),
+        migrations.AddField(
+            model_name='product',
+            name='lookup_key',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=301),
+        ),
+        migrations.RunPython(backfill_lookup_key, migrations.RunPython.noop),
+        migrations.RunPython(restore_fts, migrations.RunPython.noop),
+    ]
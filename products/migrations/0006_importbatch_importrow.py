@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_lookup_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(blank=True, max_length=255, verbose_name='Fayl nomi')),
+                ('status', models.CharField(choices=[('staged', 'Tasdiqlash kutilmoqda'), ('applied', 'Bajarildi'), ('failed', 'Xatolik')], default='staged', max_length=10, verbose_name='Holat')),
+                ('total_rows', models.IntegerField(default=0, verbose_name='Jami qatorlar')),
+                ('new_rows', models.IntegerField(default=0, verbose_name='Yangi mahsulotlar')),
+                ('update_rows', models.IntegerField(default=0, verbose_name='Yangilanadigan')),
+                ('results', models.JSONField(blank=True, null=True, verbose_name='Natija')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Yuklagan')),
+            ],
+            options={
+                'verbose_name': 'Import',
+                'verbose_name_plural': 'Importlar',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ImportRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row_number', models.IntegerField(verbose_name='Qator')),
+                ('name', models.CharField(max_length=200)),
+                ('brand', models.CharField(max_length=100)),
+                ('price', models.FloatField(null=True)),
+                ('quantity', models.FloatField(null=True)),
+                ('unit', models.CharField(max_length=10)),
+                ('action', models.CharField(choices=[('create', 'Yangi'), ('update', 'Yangilanadi')], max_length=10)),
+                ('existing_quantity', models.FloatField(blank=True, null=True)),
+                ('existing_unit', models.CharField(blank=True, max_length=10)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='products.importbatch')),
+                ('existing_product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='products.product')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_importbatch_importrow'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importbatch',
+            name='applied_through',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='error',
+            field=models.TextField(blank=True, verbose_name='Xatolik'),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='file',
+            field=models.FileField(blank=True, upload_to='imports/', verbose_name='Fayl'),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='heartbeat',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='mode',
+            field=models.CharField(default='atomic', max_length=15, verbose_name='Import rejimi'),
+        ),
+        migrations.AddField(
+            model_name='importbatch',
+            name='processed_rows',
+            field=models.IntegerField(default=0, verbose_name='Bajarilgan qatorlar'),
+        ),
+        migrations.AlterField(
+            model_name='importbatch',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Navbatda'), ('parsing', "O'qilmoqda"), ('staged', 'Tasdiqlash kutilmoqda'), ('apply_queued', 'Import navbatda'), ('applying', 'Import bajarilmoqda'), ('applied', 'Bajarildi'), ('failed', 'Xatolik')], default='queued', max_length=15, verbose_name='Holat'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_importbatch_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('products_xlsx', 'Mahsulotlar (Excel)'), ('products_csv', 'Mahsulotlar (CSV)'), ('products_ndjson', 'Mahsulotlar (JSON lines)'), ('sales_csv', 'Sotuvlar (CSV)'), ('sales_ndjson', 'Sotuvlar (JSON lines)')], max_length=20, verbose_name='Turi')),
+                ('params', models.JSONField(blank=True, default=dict, verbose_name='Filtrlar')),
+                ('status', models.CharField(choices=[('queued', 'Navbatda'), ('running', 'Bajarilmoqda'), ('done', 'Tayyor'), ('failed', 'Xatolik')], default='queued', max_length=10, verbose_name='Holat')),
+                ('file', models.FileField(blank=True, upload_to='exports/', verbose_name='Fayl')),
+                ('total_rows', models.IntegerField(default=0, verbose_name='Jami qatorlar')),
+                ('processed_rows', models.IntegerField(default=0, verbose_name='Yozilgan qatorlar')),
+                ('error', models.TextField(blank=True, verbose_name='Xatolik')),
+                ('heartbeat', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Yaratgan')),
+            ],
+            options={
+                'verbose_name': 'Export',
+                'verbose_name_plural': 'Exportlar',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:35
+
+from django.db import migrations, models
+
+from products.search import install_fts
+
+
+def restore_fts(apps, schema_editor):
+    # Adding the unique column rebuilds products_product on SQLite, which drops the FTS triggers
+    install_fts(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_updated_at_index'),
+    ]
+
+    operations = [
+        # On reverse, removing the column rebuilds the table again
+        migrations.RunPython(migrations.RunPython.noop, restore_fts),
+        migrations.AddField(
+            model_name='importrow',
+            name='barcode',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='barcode',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='Shtrix-kod'),
+        ),
+        migrations.RunPython(restore_fts, migrations.RunPython.noop),
+    ]
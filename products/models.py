@@ -1,4 +1,26 @@
-from django.db import models
+from decimal import Decimal
+from functools import partial
+from django.contrib.auth.models import User
+from django.db import models, transaction
+from django.db.models import F, Sum, Count, Max
+from django.utils import timezone
+
+def normalize_barcode(value):
+    """A scanned or typed barcode/SKU without surrounding whitespace, or None if blank"""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        # Spreadsheets read long numeric codes as floats
+        value = int(value)
+    value = ''.join(str(value).split())
+    return value or None
+
+def make_lookup_key(name, brand):
+    """Case-folded, whitespace-collapsed name+brand used for duplicate checks"""
+    name = ' '.join(str(name).split()).casefold()
+    brand = ' '.join(str(brand).split()).casefold()
+    # Whitespace is collapsed to single spaces above, so a tab cannot occur inside either part
+    return f"{name}\t{brand}"
 
 class Product(models.Model):
     UNIT_CHOICES = [
@@ -16,10 +38,17 @@ class Product(models.Model):
     unit = models.CharField(max_length=10, choices=UNIT_CHOICES, verbose_name="Oʻlchov birligi")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    lookup_key = models.CharField(max_length=301, db_index=True, editable=False, default='')
+    # NULL rather than '' when missing, so the unique index allows many products without one
+    barcode = models.CharField(max_length=64, unique=True, null=True, blank=True, verbose_name="Shtrix-kod")
     
     class Meta:
         verbose_name = "Mahsulot"
         verbose_name_plural = "Mahsulotlar"
+        indexes = [
+            # Catalog version and "changed since" lookups (products.catalog)
+            models.Index(fields=['updated_at'], name='products_product_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.brand}"
@@ -28,4 +57,307 @@ class Product(models.Model):
         # Katta-kichik harflarni standartlashtirish
         self.name = self.name.strip()
         self.brand = self.brand.strip()
-        super().save(*args, **kwargs)
\ No newline at end of file
+        self.lookup_key = make_lookup_key(self.name, self.brand)
+        self.barcode = normalize_barcode(self.barcode)
+
+        with transaction.atomic():
+            # Old price/quantity for the snapshot delta (one primary key lookup)
+            old = None
+            if self.pk:
+                old = Product.objects.filter(pk=self.pk).values('price', 'quantity').first()
+
+            super().save(*args, **kwargs)
+
+            from .typeahead import index
+            transaction.on_commit(partial(index.update, self))
+
+            price = Decimal(str(self.price))
+            quantity = Decimal(str(self.quantity))
+            if old is None:
+                InventorySnapshot.apply_delta(
+                    count=1, quantity=quantity, value=price * quantity, price=price
+                )
+            else:
+                InventorySnapshot.apply_delta(
+                    quantity=quantity - old['quantity'],
+                    value=price * quantity - old['price'] * old['quantity'],
+                    price=price - old['price'],
+                )
+
+    @classmethod
+    def find_duplicate(cls, name, brand):
+        """Existing product with the same normalized name and brand, or None"""
+        return cls.objects.filter(lookup_key=make_lookup_key(name, brand)).order_by('id').first()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            old = Product.objects.filter(pk=self.pk).values('price', 'quantity').first()
+            product_id = self.pk
+            result = super().delete(*args, **kwargs)
+            from .typeahead import index
+            transaction.on_commit(partial(index.remove, product_id))
+            if old is not None:
+                InventorySnapshot.apply_delta(
+                    count=-1,
+                    quantity=-old['quantity'],
+                    value=-(old['price'] * old['quantity']),
+                    price=-old['price'],
+                )
+        return result
+
+
+class InventorySnapshot(models.Model):
+    """
+    Single-row running totals of the product catalog.
+
+    Kept up to date by Product.save()/delete(); queryset-level
+    update()/delete() bypass it, so run the rebuild_inventory_snapshot
+    command after bulk changes.
+    """
+    product_count = models.IntegerField(default=0, verbose_name="Mahsulotlar soni")
+    total_quantity = models.DecimalField(max_digits=20, decimal_places=2, default=0, verbose_name="Jami miqdor")
+    total_value = models.DecimalField(max_digits=24, decimal_places=4, default=0, verbose_name="Jami qiymat")
+    price_sum = models.DecimalField(max_digits=20, decimal_places=2, default=0, verbose_name="Narxlar yig'indisi")
+    last_updated = models.DateTimeField(null=True, blank=True, verbose_name="Oxirgi yangilanish")
+
+    SNAPSHOT_ID = 1
+
+    class Meta:
+        verbose_name = "Ombor holati"
+        verbose_name_plural = "Ombor holati"
+
+    def __str__(self):
+        return f"{self.product_count} mahsulot, {self.total_value} so'm"
+
+    @property
+    def avg_price(self):
+        if not self.product_count:
+            return Decimal('0')
+        return self.price_sum / self.product_count
+
+    @property
+    def avg_quantity(self):
+        if not self.product_count:
+            return Decimal('0')
+        return self.total_quantity / self.product_count
+
+    @classmethod
+    def compute(cls):
+        """Totals computed from scratch over the Product table"""
+        totals = Product.objects.aggregate(
+            product_count=Count('id'),
+            total_quantity=Sum('quantity'),
+            total_value=Sum(F('price') * F('quantity')),
+            price_sum=Sum('price'),
+            last_updated=Max('updated_at'),
+        )
+        return {
+            'product_count': totals['product_count'],
+            'total_quantity': totals['total_quantity'] or Decimal('0'),
+            'total_value': totals['total_value'] or Decimal('0'),
+            'price_sum': totals['price_sum'] or Decimal('0'),
+            'last_updated': totals['last_updated'],
+        }
+
+    @classmethod
+    def rebuild(cls):
+        snapshot, _ = cls.objects.update_or_create(pk=cls.SNAPSHOT_ID, defaults=cls.compute())
+        return snapshot
+
+    @classmethod
+    def current(cls):
+        """The snapshot row, built from scratch if it does not exist yet"""
+        snapshot = cls.objects.filter(pk=cls.SNAPSHOT_ID).first()
+        if snapshot is None:
+            snapshot = cls.rebuild()
+        return snapshot
+
+    @classmethod
+    def apply_delta(cls, count=0, quantity=0, value=0, price=0):
+        """Shift the running totals in place with a single UPDATE"""
+        updated = cls.objects.filter(pk=cls.SNAPSHOT_ID).update(
+            product_count=F('product_count') + count,
+            total_quantity=F('total_quantity') + quantity,
+            total_value=F('total_value') + value,
+            price_sum=F('price_sum') + price,
+            last_updated=timezone.now(),
+        )
+        if not updated:
+            # First change ever: the row is built from the already-saved data
+            cls.rebuild()
+
+
+class ImportBatch(models.Model):
+    """
+    An uploaded supplier file whose rows are staged in ImportRow until applied.
+
+    Also the background job record (see products.jobs): the file is parsed
+    into rows and the rows are applied chunk by chunk, with progress saved
+    in the same transaction as each chunk.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Navbatda'),
+        ('parsing', "O'qilmoqda"),
+        ('staged', 'Tasdiqlash kutilmoqda'),
+        ('apply_queued', 'Import navbatda'),
+        ('applying', 'Import bajarilmoqda'),
+        ('applied', 'Bajarildi'),
+        ('failed', 'Xatolik'),
+    ]
+
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name="Yuklagan"
+    )
+    file = models.FileField(upload_to='imports/', blank=True, verbose_name="Fayl")
+    file_name = models.CharField(max_length=255, blank=True, verbose_name="Fayl nomi")
+    status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='queued', verbose_name="Holat")
+    mode = models.CharField(max_length=15, default='atomic', verbose_name="Import rejimi")
+    total_rows = models.IntegerField(default=0, verbose_name="Jami qatorlar")
+    new_rows = models.IntegerField(default=0, verbose_name="Yangi mahsulotlar")
+    update_rows = models.IntegerField(default=0, verbose_name="Yangilanadigan")
+    processed_rows = models.IntegerField(default=0, verbose_name="Bajarilgan qatorlar")
+    # ID of the last ImportRow whose chunk was committed; the apply resumes after it
+    applied_through = models.BigIntegerField(default=0)
+    results = models.JSONField(null=True, blank=True, verbose_name="Natija")
+    error = models.TextField(blank=True, verbose_name="Xatolik")
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Import"
+        verbose_name_plural = "Importlar"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.file_name} ({self.get_status_display()})"
+
+    @property
+    def percent(self):
+        """Apply progress in percent; None while the file is still being read"""
+        if self.status in ('queued', 'parsing'):
+            return None
+        if not self.total_rows:
+            return 100 if self.status == 'applied' else 0
+        return min(100, round(self.processed_rows * 100 / self.total_rows))
+
+
+class ExportJob(models.Model):
+    """An export written to a file in the background (see products.jobs), then downloaded"""
+    KIND_CHOICES = [
+        ('products_xlsx', 'Mahsulotlar (Excel)'),
+        ('products_csv', 'Mahsulotlar (CSV)'),
+        ('products_ndjson', 'Mahsulotlar (JSON lines)'),
+        ('sales_csv', 'Sotuvlar (CSV)'),
+        ('sales_ndjson', 'Sotuvlar (JSON lines)'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Navbatda'),
+        ('running', 'Bajarilmoqda'),
+        ('done', 'Tayyor'),
+        ('failed', 'Xatolik'),
+    ]
+
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        verbose_name="Yaratgan"
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="Turi")
+    # Filter parameters as on the list pages (search, unit, date_from, date_to)
+    params = models.JSONField(default=dict, blank=True, verbose_name="Filtrlar")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued', verbose_name="Holat")
+    file = models.FileField(upload_to='exports/', blank=True, verbose_name="Fayl")
+    total_rows = models.IntegerField(default=0, verbose_name="Jami qatorlar")
+    processed_rows = models.IntegerField(default=0, verbose_name="Yozilgan qatorlar")
+    error = models.TextField(blank=True, verbose_name="Xatolik")
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Export"
+        verbose_name_plural = "Exportlar"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} ({self.get_status_display()})"
+
+    @property
+    def percent(self):
+        if self.status == 'done':
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(100, round(self.processed_rows * 100 / self.total_rows))
+
+
+class ImportRow(models.Model):
+    """One normalized row of an ImportBatch, matched against existing products"""
+    ACTION_CHOICES = [
+        ('create', 'Yangi'),
+        ('update', 'Yangilanadi'),
+    ]
+
+    batch = models.ForeignKey(ImportBatch, on_delete=models.CASCADE, related_name='rows')
+    row_number = models.IntegerField(verbose_name="Qator")
+    name = models.CharField(max_length=200)
+    brand = models.CharField(max_length=100)
+    barcode = models.CharField(max_length=64, blank=True)
+    # Floats as read from the sheet; empty cells are NULL and rejected when applied
+    price = models.FloatField(null=True)
+    quantity = models.FloatField(null=True)
+    unit = models.CharField(max_length=10)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    existing_product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True)
+    existing_quantity = models.FloatField(null=True, blank=True)
+    existing_unit = models.CharField(max_length=10, blank=True)
+
+    class Meta:
+        ordering = ['id']
+
+    @classmethod
+    def from_preview(cls, batch, row):
+        existing = row['existing_product']
+        return cls(
+            batch=batch,
+            row_number=row['index'],
+            name=row['name'][:200],
+            brand=row['brand'][:100],
+            barcode=(row.get('barcode') or '')[:64],
+            price=None if row['price'] != row['price'] else row['price'],  # NaN -> NULL
+            quantity=None if row['quantity'] != row['quantity'] else row['quantity'],
+            unit=row['unit'],
+            action=row['action'],
+            existing_product_id=existing['id'] if existing else None,
+            existing_quantity=existing['quantity'] if existing else None,
+            existing_unit=existing['unit'] if existing else '',
+        )
+
+    def to_preview(self):
+        """The row in the dict shape used by the preview page and apply_import"""
+        existing_product = None
+        if self.action == 'update' and self.existing_product_id:
+            existing_product = {
+                'id': self.existing_product_id,
+                'quantity': self.existing_quantity,
+                'unit': self.existing_unit,
+            }
+        return {
+            'index': self.row_number,
+            'name': self.name,
+            'brand': self.brand,
+            'barcode': self.barcode or None,
+            'price': self.price,
+            'quantity': self.quantity,
+            'unit': self.unit,
+            'existing_product': existing_product,
+            'action': self.action,
+            'row_id': self.id,
+        }
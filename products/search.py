@@ -0,0 +1,142 @@
+"""
+Product name/brand search.
+
+On SQLite with FTS5 the products_product_fts virtual table (external
+content over products_product, synced by triggers) answers prefix
+queries from its index and ranks them with bm25. Other databases, or
+SQLite builds without FTS5, fall back to icontains filters.
+"""
+import re
+
+from django.db import connection, OperationalError
+from django.db.models import Q, FloatField
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'products_product_fts'
+
+FTS_SETUP_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, brand,
+        content='products_product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON products_product BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, brand) VALUES (new.id, new.name, new.brand);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON products_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, brand) VALUES ('delete', old.id, old.name, old.brand);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, brand ON products_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, brand) VALUES ('delete', old.id, old.name, old.brand);
+        INSERT INTO {FTS_TABLE}(rowid, name, brand) VALUES (new.id, new.name, new.brand);
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+FTS_TEARDOWN_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+_fts_available = {}
+
+
+def install_fts(schema_editor):
+    """
+    Create the FTS table and its sync triggers, then reindex.
+
+    Safe to run again: migrations that rebuild products_product on SQLite
+    drop the triggers with the old table and call this to restore them.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        with schema_editor.connection.cursor() as cursor:
+            for sql in FTS_SETUP_SQL:
+                cursor.execute(sql)
+    except OperationalError as e:
+        # SQLite compiled without FTS5: searches use the icontains fallback
+        print(f"FTS5 o'rnatilmadi: {e}")
+
+
+def uninstall_fts(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for sql in FTS_TEARDOWN_SQL:
+            cursor.execute(sql)
+
+
+def fts_available():
+    """True when the FTS table exists on the default database (checked once per process)"""
+    key = connection.settings_dict['NAME']
+    if key not in _fts_available:
+        available = False
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+                )
+                available = cursor.fetchone() is not None
+        _fts_available[key] = available
+    return _fts_available[key]
+
+
+def build_match_query(query):
+    """Turn user input into an FTS5 query: every word must match as a prefix"""
+    tokens = re.findall(r'\w+', query)
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_products(queryset, query, ranked=False):
+    """
+    Filter a Product queryset by name/brand.
+
+    With ranked=True the result is also ordered by relevance, see
+    rank_products().
+    """
+    query = query.strip()
+    if not query:
+        return queryset
+
+    if fts_available():
+        match = build_match_query(query)
+        if not match:
+            return queryset.none()
+        queryset = queryset.filter(id__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]
+        ))
+    else:
+        queryset = queryset.filter(Q(name__icontains=query) | Q(brand__icontains=query))
+
+    if ranked:
+        queryset = rank_products(queryset, query)
+    return queryset
+
+
+def rank_products(queryset, query):
+    """
+    Order already-filtered search results by relevance.
+
+    With FTS5 the queryset is annotated with search_rank (bm25, lower is
+    better); the fallback orders by name.
+    """
+    match = build_match_query(query)
+    if fts_available() and match:
+        return queryset.annotate(search_rank=RawSQL(
+            f"SELECT rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"AND rowid = products_product.id",
+            [match],
+            output_field=FloatField(),
+        )).order_by('search_rank', 'id')
+    return queryset.order_by('name', 'id')
@@ -1,3 +1,201 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.utils import timezone
+
+from . import importing
+from .catalog import catalog_payload, changed_products, current_version
+from .importing import MODE_ATOMIC, MODE_BEST_EFFORT, ImportAborted, apply_import
+from .jobs import apply_job
+from .models import ImportBatch, ImportRow, InventorySnapshot, Product, make_lookup_key
+
+
+def preview_row(index, name, brand, price, quantity, unit='dona', barcode=None, existing=None):
+    """A row in the shape resolve_rows() / ImportRow.to_preview() produce"""
+    return {
+        'index': index,
+        'name': name,
+        'brand': brand,
+        'barcode': barcode,
+        'price': price,
+        'quantity': quantity,
+        'unit': unit,
+        'existing_product': {'id': existing.id, 'quantity': float(existing.quantity), 'unit': existing.unit} if existing else None,
+        'action': 'update' if existing else 'create',
+    }
+
+
+class ImportApplyTests(TestCase):
+    def setUp(self):
+        self.tap = Product.objects.create(name='Smesitel', brand='Grohe', price=Decimal('250000'), quantity=Decimal('4'), unit='dona', barcode='4005176')
+
+    def assertSnapshotInSync(self):
+        stored = InventorySnapshot.current()
+        fresh = InventorySnapshot.compute()
+        for field in ('product_count', 'total_quantity', 'total_value', 'price_sum'):
+            self.assertAlmostEqual(Decimal(str(getattr(stored, field))), Decimal(str(fresh[field])), places=2, msg=field)
+
+    def test_update_row_adds_quantity_and_replaces_price(self):
+        results = apply_import([preview_row(2, 'Smesitel', 'Grohe', 240000, 3, existing=self.tap)])
+
+        self.tap.refresh_from_db()
+        self.assertEqual((results['created'], results['updated'], results['errors']), (0, 1, 0))
+        self.assertEqual(self.tap.quantity, Decimal('7'))
+        self.assertEqual(self.tap.price, Decimal('240000'))
+        self.assertEqual(self.tap.barcode, '4005176')
+        self.assertSnapshotInSync()
+
+    def test_repeated_new_rows_become_one_product(self):
+        results = apply_import([
+            preview_row(2, 'Truba 20', 'Pro', 1000, 5, unit='metr'),
+            preview_row(3, ' truba  20 ', 'PRO', 1100, 7, unit='metr', barcode='777'),
+        ])
+
+        products = Product.objects.filter(lookup_key=make_lookup_key('Truba 20', 'Pro'))
+        self.assertEqual(products.count(), 1)
+        pipe = products.get()
+        self.assertEqual(pipe.quantity, Decimal('12'))
+        self.assertEqual(pipe.price, Decimal('1100'))
+        self.assertEqual(pipe.barcode, '777')
+        self.assertEqual(results['created'], 2)
+        self.assertSnapshotInSync()
+
+    def test_rows_matching_a_product_from_an_earlier_chunk_update_it(self):
+        results = apply_import([
+            preview_row(2, 'Kran', 'Valtec', 5000, 2),
+            preview_row(3, 'Kran', 'Valtec', 5200, 3),
+        ], chunk_size=1)
+
+        self.assertEqual(Product.objects.filter(name='Kran').count(), 1)
+        self.assertEqual(Product.objects.get(name='Kran').quantity, Decimal('5'))
+        self.assertEqual([(chunk['created'], chunk['updated']) for chunk in results['chunks']], [(1, 0), (0, 1)])
+        self.assertSnapshotInSync()
+
+    def test_barcode_of_another_product_is_rejected(self):
+        results = apply_import([
+            preview_row(2, 'Kran', 'Valtec', 5000, 2, barcode='4005176'),
+            preview_row(3, 'Truba', 'Pro', 1000, 1, barcode='999'),
+            preview_row(4, 'Tirsak', 'Pro', 300, 1, barcode='999'),
+        ], mode=MODE_BEST_EFFORT)
+
+        self.assertEqual((results['created'], results['errors']), (1, 2))
+        self.assertFalse(Product.objects.filter(name__in=['Kran', 'Tirsak']).exists())
+        self.assertEqual(Product.objects.get(barcode='999').name, 'Truba')
+        self.assertTrue(all('boshqa mahsulotda bor' in message for message in results['error_messages']))
+
+    def test_atomic_import_rolls_back_on_a_bad_row(self):
+        rows = [
+            preview_row(2, 'Kran', 'Valtec', 5000, 2),
+            preview_row(3, 'Smesitel', 'Grohe', 240000, 3, existing=self.tap),
+            preview_row(4, 'Truba', 'Pro', float('nan'), 1),
+        ]
+        with self.assertRaises(ImportAborted) as raised:
+            apply_import(rows, mode=MODE_ATOMIC, chunk_size=2)
+
+        self.assertEqual(raised.exception.results['errors'], 1)
+        self.assertEqual(Product.objects.count(), 1)
+        self.tap.refresh_from_db()
+        self.assertEqual(self.tap.quantity, Decimal('4'))
+        self.assertSnapshotInSync()
+
+    def test_failed_atomic_job_returns_the_batch_to_staged(self):
+        user = User.objects.create_user('ombor', password='x')
+        batch = ImportBatch.objects.create(created_by=user, file_name='narxlar.xlsx', status='applying', mode=MODE_ATOMIC, total_rows=2)
+        ImportRow.objects.bulk_create([
+            ImportRow(batch=batch, row_number=2, name='Kran', brand='Valtec', price=5000, quantity=2, unit='dona', action='create'),
+            ImportRow(batch=batch, row_number=3, name='Truba', brand='Pro', price=None, quantity=1, unit='metr', action='create'),
+        ])
+
+        apply_job(batch)
+
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, 'staged')
+        self.assertEqual((batch.processed_rows, batch.applied_through), (0, 0))
+        self.assertIn('hech narsa saqlanmadi', batch.error)
+        self.assertEqual(batch.rows.count(), 2)
+        self.assertFalse(Product.objects.filter(name='Kran').exists())
+
+    def test_best_effort_skips_only_the_rows_that_break_a_chunk(self):
+        clean_row = importing.clean_row
+
+        def failing_clean_row(product_data):
+            if product_data['name'] == 'Buzuq':
+                raise RuntimeError('broken row')
+            return clean_row(product_data)
+
+        rows = [
+            preview_row(2, 'Kran', 'Valtec', 5000, 2),
+            preview_row(3, 'Buzuq', 'Pro', 100, 1),
+            preview_row(4, 'Smesitel', 'Grohe', 240000, 1, existing=self.tap),
+            preview_row(5, 'Truba', 'Pro', 1000, 3, unit='metr'),
+        ]
+        with mock.patch.object(importing, 'clean_row', failing_clean_row):
+            results = apply_import(rows, mode=MODE_BEST_EFFORT, chunk_size=2)
+
+        self.assertEqual((results['created'], results['updated'], results['errors']), (2, 1, 1))
+        self.assertIn('Qator 3: Buzuq', results['error_messages'][0])
+        self.assertEqual(
+            sorted(Product.objects.values_list('name', flat=True)),
+            ['Kran', 'Smesitel', 'Truba'],
+        )
+        self.tap.refresh_from_db()
+        self.assertEqual(self.tap.quantity, Decimal('5'))
+        self.assertSnapshotInSync()
+
+
+class CatalogDeltaTests(TestCase):
+    def setUp(self):
+        self.tap = Product.objects.create(name='Smesitel', brand='Grohe', price=Decimal('250000'), quantity=Decimal('4'), unit='dona')
+        self.valve = Product.objects.create(name='Kran', brand='Valtec', price=Decimal('5000'), quantity=Decimal('2'), unit='dona')
+        # Far older than DELTA_OVERLAP; the valve is the last write before the since version
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        Product.objects.update(created_at=an_hour_ago - timedelta(days=1), updated_at=an_hour_ago - timedelta(hours=1))
+        Product.objects.filter(pk=self.valve.pk).update(updated_at=an_hour_ago)
+        self.tap.refresh_from_db()
+        self.valve.refresh_from_db()
+        self.since = current_version()
+
+    def test_unchanged_catalog_has_an_empty_delta(self):
+        self.assertEqual(current_version(), self.since)
+        self.assertEqual(list(changed_products(self.since, self.since)), [])
+
+    def test_malformed_version_needs_the_full_catalog(self):
+        for since in (None, '', 'abc', '12-x', '-5-2'):
+            self.assertIsNone(changed_products(since, current_version()), since)
+
+    def test_delta_holds_changed_and_created_products(self):
+        self.valve.quantity = Decimal('0')
+        self.valve.save()
+        pipe = Product.objects.create(name='Truba', brand='Pro', price=Decimal('1000'), quantity=Decimal('9'), unit='metr')
+
+        version = current_version()
+        self.assertNotEqual(version, self.since)
+        self.assertEqual(list(changed_products(self.since, version)), [self.valve, pipe])
+
+        payload = catalog_payload(self.since)
+        self.assertFalse(payload['full'])
+        # Out-of-stock products are sent too, so the client drops them
+        self.assertEqual([row[0] for row in payload['rows']], [self.valve.id, pipe.id])
+
+    def test_stock_update_without_save_is_in_the_delta(self):
+        # Checkout changes stock with a queryset update that sets updated_at itself
+        Product.objects.filter(pk=self.tap.pk).update(quantity=Decimal('3'), updated_at=timezone.now())
+        # The valve, written at the since version itself, is re-sent by the overlap
+        self.assertEqual(list(changed_products(self.since, current_version())), [self.tap, self.valve])
+
+    def test_deletion_needs_the_full_catalog(self):
+        self.valve.delete()
+        self.assertIsNone(changed_products(self.since, current_version()))
+
+        payload = catalog_payload(self.since)
+        self.assertTrue(payload['full'])
+        self.assertEqual([row[0] for row in payload['rows']], [self.tap.id])
 
-# Create your tests here.
+    def test_deletion_hidden_by_a_creation_is_still_detected(self):
+        # Same count as before, but one product fewer than old count + created
+        self.valve.delete()
+        Product.objects.create(name='Truba', brand='Pro', price=Decimal('1000'), quantity=Decimal('9'), unit='metr')
+        self.assertIsNone(changed_products(self.since, current_version()))
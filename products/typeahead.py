@@ -0,0 +1,267 @@
+"""
+In-memory typeahead index over product name and brand.
+
+Each process keeps its own index: maps from every word prefix (up to
+PREFIX_MAX_LENGTH characters) to product IDs, and a map from trigrams to
+product IDs for matches inside a word. A query intersects those sets
+per word and never touches the database.
+
+Product.save()/delete() update the index of the process that made the
+change once the transaction commits. Changes made anywhere else (other
+processes, checkout's stock UPDATEs, imports) are picked up by checking
+the catalog version (products.catalog) at most every
+TYPEAHEAD_REFRESH_SECONDS and applying the rows changed since; deleted
+products make the next check reload the index.
+"""
+import heapq
+import re
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+
+from .catalog import current_version, changed_products
+from .models import Product
+
+PREFIX_MAX_LENGTH = 12
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+DEFAULT_REFRESH_SECONDS = 2
+
+INDEX_FIELDS = ['id', 'name', 'brand', 'price', 'quantity', 'unit']
+
+
+def tokenize(text):
+    return re.findall(r'\w+', str(text).casefold())
+
+
+def trigrams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+class Entry:
+    __slots__ = ['id', 'name', 'brand', 'price', 'quantity', 'unit', 'name_key', 'name_words', 'brand_words', 'text']
+
+    def __init__(self, id, name, brand, price, quantity, unit):
+        self.id = id
+        self.name = name
+        self.brand = brand
+        self.price = Decimal(str(price))
+        self.quantity = Decimal(str(quantity))
+        self.unit = unit
+        self.name_words = set(tokenize(name))
+        self.brand_words = set(tokenize(brand))
+        self.name_key = ' '.join(tokenize(name))
+        self.text = f"{self.name_key} {' '.join(tokenize(brand))}"
+
+    def sort_key(self):
+        return len(self.name), self.name_key, self.id
+
+    def as_result(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'brand': self.brand,
+            'price': str(self.price),
+            'quantity': str(self.quantity),
+            'unit': self.unit,
+        }
+
+
+def prefixes(value):
+    return [value[:length] for length in range(1, min(len(value), PREFIX_MAX_LENGTH) + 1)]
+
+
+class TypeaheadIndex:
+    """
+    Sets of product IDs keyed by name-word prefix, brand-word prefix,
+    whole-name prefix and trigram, so matching and ranking are set
+    operations. Results within a tier are ordered by Entry.sort_key
+    (shorter names first, then alphabetically).
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clear()
+        self.version = None
+        self._checked_at = 0.0
+
+    def _clear(self):
+        self._entries = {}
+        self._name_prefixes = defaultdict(set)
+        self._brand_prefixes = defaultdict(set)
+        self._name_starts = defaultdict(set)
+        self._trigrams = defaultdict(set)
+        self._in_stock = set()
+        self._sort_keys = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _keys(self, entry):
+        """(mapping, key) pairs the entry's ID is stored under"""
+        for word in entry.name_words:
+            for prefix in prefixes(word):
+                yield self._name_prefixes, prefix
+        for word in entry.brand_words:
+            for prefix in prefixes(word):
+                yield self._brand_prefixes, prefix
+        for prefix in prefixes(entry.name_key):
+            yield self._name_starts, prefix
+        for word in entry.name_words | entry.brand_words:
+            for trigram in trigrams(word):
+                yield self._trigrams, trigram
+
+    def _add(self, entry):
+        old = self._entries.get(entry.id)
+        if old is not None:
+            if old.name == entry.name and old.brand == entry.brand:
+                # Price or stock change: the word maps stay as they are
+                self._entries[entry.id] = entry
+                self._set_stock(entry)
+                return
+            self._discard(entry.id)
+        self._entries[entry.id] = entry
+        for mapping, key in self._keys(entry):
+            mapping[key].add(entry.id)
+        self._set_stock(entry)
+        self._sort_keys[entry.id] = entry.sort_key()
+
+    def _set_stock(self, entry):
+        if entry.quantity > 0:
+            self._in_stock.add(entry.id)
+        else:
+            self._in_stock.discard(entry.id)
+
+    def _discard(self, product_id):
+        entry = self._entries.pop(product_id, None)
+        if entry is None:
+            return
+        for mapping, key in self._keys(entry):
+            ids = mapping.get(key)
+            if ids is not None:
+                ids.discard(product_id)
+                if not ids:
+                    del mapping[key]
+        self._in_stock.discard(product_id)
+        self._sort_keys.pop(product_id, None)
+
+    def apply(self, rows):
+        """Add or replace products given as dicts of INDEX_FIELDS"""
+        with self._lock:
+            for row in rows:
+                self._add(Entry(**row))
+
+    def load(self, version=None):
+        """Rebuild the whole index from the database"""
+        if version is None:
+            version = current_version()
+        rows = list(Product.objects.values(*INDEX_FIELDS))
+        with self._lock:
+            self._clear()
+            self.apply(rows)
+            self.version = version
+
+    def refresh(self, force=False):
+        """Bring the index up to date with the database, at most once per refresh interval"""
+        now = time.monotonic()
+        interval = getattr(settings, 'TYPEAHEAD_REFRESH_SECONDS', DEFAULT_REFRESH_SECONDS)
+        if not force and self.version is not None and now - self._checked_at < interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            version = current_version()
+            if version == self.version:
+                return
+            changed = changed_products(self.version, version) if self.version else None
+            if changed is None:
+                self.load(version)
+            else:
+                self.apply(changed.values(*INDEX_FIELDS))
+                self.version = version
+
+    def update(self, product):
+        """Index a saved product (called by Product.save() after commit)"""
+        self.apply([{field: getattr(product, field) for field in INDEX_FIELDS}])
+
+    def remove(self, product_id):
+        with self._lock:
+            self._discard(product_id)
+
+    def _starting_with(self, mapping, value, words_of):
+        """IDs under a prefix key; values longer than the stored prefixes are checked per entry"""
+        ids = mapping.get(value[:PREFIX_MAX_LENGTH], set())
+        if len(value) <= PREFIX_MAX_LENGTH:
+            return ids
+        return {product_id for product_id in ids if any(w.startswith(value) for w in words_of(self._entries[product_id]))}
+
+    def _name_word_matches(self, word):
+        return self._starting_with(self._name_prefixes, word, lambda entry: entry.name_words)
+
+    def _word_matches(self, word):
+        return self._name_word_matches(word) | self._starting_with(self._brand_prefixes, word, lambda entry: entry.brand_words)
+
+    def _inside_matches(self, word):
+        grams = sorted((self._trigrams.get(trigram, set()) for trigram in trigrams(word)), key=len)
+        if not grams or not grams[0]:
+            return set()
+        inside = grams[0].intersection(*grams[1:])
+        return {product_id for product_id in inside if word in self._entries[product_id].text}
+
+    def search(self, query, limit=DEFAULT_LIMIT, in_stock=True):
+        """
+        Best matches for the query as result dicts: every word of the query
+        must start (or, from 3 letters, appear inside) a word of the name or
+        brand. Names starting with the query come first, then products whose
+        name words match every query word, then brand and inside-word matches.
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+        phrase = ' '.join(words)
+        # Longest words first: their sets are the smallest
+        words.sort(key=len, reverse=True)
+
+        with self._lock:
+            # Prefix matches first; inside-word matches are only looked up
+            # when those do not fill the limit
+            candidates = self._in_stock if in_stock else None
+            for word in words:
+                ids = self._word_matches(word)
+                candidates = ids if candidates is None else candidates & ids
+
+            tiers = [
+                lambda: candidates & self._starting_with(self._name_starts, phrase, lambda entry: [entry.name_key]),
+                lambda: candidates.intersection(*(self._name_word_matches(word) for word in words)),
+                lambda: candidates,
+                lambda: self._inside_candidates(words, in_stock),
+            ]
+            found = []
+            for tier in tiers:
+                ids = tier().difference(found)
+                found.extend(heapq.nsmallest(limit - len(found), ids, key=self._sort_keys.__getitem__))
+                if len(found) >= limit:
+                    break
+            return [self._entries[product_id].as_result() for product_id in found]
+
+    def _inside_candidates(self, words, in_stock):
+        """IDs matching every word as a prefix or, from 3 letters, inside a word"""
+        ids = self._in_stock if in_stock else None
+        for word in words:
+            matches = self._word_matches(word)
+            if len(word) >= 3:
+                matches = matches | self._inside_matches(word)
+            ids = matches if ids is None else ids & matches
+            if not ids:
+                break
+        return ids
+
+
+index = TypeaheadIndex()
+
+
+def autocomplete(query, limit=DEFAULT_LIMIT, in_stock=True):
+    """Top matches for a typeahead query, from this process's index"""
+    index.refresh()
+    return index.search(query, limit=min(max(limit, 1), MAX_LIMIT), in_stock=in_stock)
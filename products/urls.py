@@ -1,10 +1,12 @@
 from django.urls import path
-from .views import statistics_view, product_list, product_create, product_view, product_edit, product_delete, check_existing_product, update_existing_product, product_import, process_import, export_products_excel
+from .views import statistics_view, product_list, product_create, product_view, product_edit, product_delete, check_existing_product, update_existing_product, product_import, import_preview, import_status, process_import, export_products_excel, export_products_csv, export_products_ndjson, export_jobs, export_job_download
 
 urlpatterns = [
     path('', product_list, name='productlist'),
     path('create/', product_create, name='productcreate'),
     path('import/', product_import, name='productimport'),
+    path('import/<int:batch_id>/', import_preview, name='import_preview'),
+    path('import/<int:batch_id>/status/', import_status, name='import_status'),
     path('import/process/', process_import, name='process_import'),
     path('check-existing/', check_existing_product, name='check_existing_product'),
     path('update-existing/', update_existing_product, name='update_existing_product'),
@@ -12,6 +14,10 @@ urlpatterns = [
     path('<int:id>/edit/', product_edit, name='productedit'),
     path('<int:id>/delete/', product_delete, name='productdelete'),
     path('export/', export_products_excel, name='product_export'),
+    path('export/csv/', export_products_csv, name='product_export_csv'),
+    path('export/ndjson/', export_products_ndjson, name='product_export_ndjson'),
+    path('exports/', export_jobs, name='export_jobs'),
+    path('exports/<int:job_id>/download/', export_job_download, name='export_job_download'),
 
     path('statistics/', statistics_view, name='statistics')
 ]
\ No newline at end of file
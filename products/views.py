@@ -1,76 +1,117 @@
 from datetime import timedelta
 from decimal import Decimal
 from django.shortcuts import render, get_object_or_404, redirect
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, StreamingHttpResponse, FileResponse
 from django.db import IntegrityError
+from django.db.models import ProtectedError
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models import Q, Sum, Avg, F, Max
+from django.db.models import Q, Sum, Avg, F, Max, Count, Case, When, Value, CharField, DecimalField, Subquery
+from django.db.models.functions import Coalesce, NullIf
+from django.core.paginator import Paginator
 import json
 
 from django.utils import timezone
-from .models import Product
+from .models import Product, InventorySnapshot, ImportBatch, ExportJob
 from .forms import ProductForm, ExcelImportForm
-import pandas as pd
+from .search import search_products, rank_products
+from .importing import MODE_ATOMIC, APPLY_MODES
+from .filters import filter_products, parse_date_range
+from .exporting import (
+    write_products_xlsx, iter_product_records, iter_csv, iter_ndjson,
+    PRODUCT_FIELDS, XLSX_CONTENT_TYPE, CSV_CONTENT_TYPE, NDJSON_CONTENT_TYPE
+)
+from . import export_cache
+from .jobs import (
+    enqueue_parse, enqueue_apply, discard_batches, is_stale, start_worker,
+    enqueue_export, can_enqueue_export, is_export_stale, export_file_name
+)
+
+PRODUCTS_PER_PAGE = 50
+IMPORT_PREVIEW_PER_PAGE = 100
+
+# Filters a background export keeps from the page it was started on
+EXPORT_JOB_PARAMS = ['search', 'unit', 'product', 'seller', 'client', 'payment_method', 'date_from', 'date_to']
+
+
+def stock_level_expression(avg_quantity):
+    """SQL expression classifying a product's stock as low, medium or high"""
+    low_threshold = Decimal(str(avg_quantity)) * Decimal('0.1')
+    high_threshold = Decimal(str(avg_quantity)) * Decimal('0.5')
+    return Case(
+        When(quantity__lt=low_threshold, then=Value('low')),
+        When(quantity__lt=high_threshold, then=Value('medium')),
+        default=Value('high'),
+        output_field=CharField(),
+    )
 
 @login_required
 def export_products_excel(request):
     """Export products to Excel"""
-    # Get filtered products
-    search_query = request.GET.get('search', '')
-    unit_filter = request.GET.get('unit', '')
-    stock_filter = request.GET.get('stock', '')
-    
-    products = Product.objects.all()
-    
-    if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) | 
-            Q(brand__icontains=search_query)
-        )
-    
-    if unit_filter:
-        products = products.filter(unit=unit_filter)
-    
-    # Create DataFrame
-    data = []
-    for product in products:
-        data.append({
-            'ID': product.id,
-            'Nomi': product.name,
-            'Brend': product.brand,
-            'Narx (so\'m)': float(product.price),
-            'Miqdor': float(product.quantity),
-            'O\'lchov birligi': product.get_unit_display(),
-            'Yaratilgan sana': product.created_at.strftime('%d.%m.%Y %H:%M'),
-            'Yangilangan sana': product.updated_at.strftime('%d.%m.%Y %H:%M')
-        })
-    
-    df = pd.DataFrame(data)
-    
-    # Create HTTP response with Excel file
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="mahsulotlar.xlsx"'
-    
-    with pd.ExcelWriter(response, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='Mahsulotlar', index=False)
-        
-        # Auto-adjust columns width
-        worksheet = writer.sheets['Mahsulotlar']
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = (max_length + 2)
-            worksheet.column_dimensions[column_letter].width = adjusted_width
-    
+    products = filter_products(request.GET)
+    
+    # Identical exports (same filters, unchanged data) are served from the on-disk cache
+    artifact = export_cache.get_or_build(
+        'products.xlsx',
+        export_cache.normalize_params(request.GET, ['search', 'unit']),
+        products,
+        build=lambda output: write_products_xlsx(products, output),
+        suffix='.xlsx',
+    )
+    return export_cache.serve(request, artifact, 'mahsulotlar.xlsx', XLSX_CONTENT_TYPE)
+
+@login_required
+def export_products_csv(request):
+    """Stream products as CSV, for the accounting integration"""
+    records = iter_product_records(filter_products(request.GET))
+    response = StreamingHttpResponse(iter_csv(PRODUCT_FIELDS, records), content_type=CSV_CONTENT_TYPE)
+    response['Content-Disposition'] = 'attachment; filename="mahsulotlar.csv"'
+    return response
+
+@login_required
+def export_products_ndjson(request):
+    """Stream products as JSON lines, one object per product"""
+    records = iter_product_records(filter_products(request.GET))
+    response = StreamingHttpResponse(iter_ndjson(PRODUCT_FIELDS, records), content_type=NDJSON_CONTENT_TYPE)
+    response['Content-Disposition'] = 'attachment; filename="mahsulotlar.ndjson"'
     return response
 
+@login_required
+def export_jobs(request):
+    """Background exports of the current user; POST queues a new one"""
+    error = ''
+    if request.method == 'POST':
+        kind = request.POST.get('kind', '')
+        if kind not in dict(ExportJob.KIND_CHOICES):
+            error = "Noma'lum export turi"
+        elif not can_enqueue_export(request.user):
+            error = "Navbatda juda ko'p export bor, avvalgilari tugashini kuting"
+        else:
+            params = {key: request.POST[key].strip() for key in EXPORT_JOB_PARAMS if request.POST.get(key, '').strip()}
+            enqueue_export(kind, params, user=request.user)
+            return redirect('export_jobs')
+    
+    jobs = list(ExportJob.objects.filter(created_by=request.user)[:50])
+    has_pending = any(job.status in ('queued', 'running') for job in jobs)
+    
+    # Queued or crashed exports are picked up by this process if no worker has them
+    if any(job.status == 'queued' or is_export_stale(job) for job in jobs):
+        start_worker('exports')
+    
+    return render(request, "products/export_jobs.html", {
+        "jobs": jobs,
+        "has_pending": has_pending,
+        "error": error,
+        "kind_choices": ExportJob.KIND_CHOICES,
+        "unit_choices": Product.UNIT_CHOICES,
+    })
+
+@login_required
+def export_job_download(request, job_id):
+    job = get_object_or_404(ExportJob, id=job_id, created_by=request.user, status='done')
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=export_file_name(job))
+
 @login_required
 def product_import(request):
     if request.method == 'POST':
@@ -79,90 +120,14 @@ def product_import(request):
             excel_file = request.FILES['excel_file']
             
             try:
-                # Read Excel file
-                df = pd.read_excel(excel_file)
-                
-                # Check and map column names
-                column_mapping = {
-                    'Nomi': 'name',
-                    'Brend': 'brand', 
-                    'Narx (so‘m)': 'price',
-                    'Narx': 'price',
-                    'Dona': 'quantity',
-                    'Miqdor': 'quantity',
-                    'O‘lchov birligi': 'unit',
-                    'Oʻlchov birligi': 'unit'
-                }
-                
-                # Rename columns to standard names
-                df = df.rename(columns=column_mapping)
-                
-                # Check required columns after mapping
-                required_columns = ['name', 'brand', 'price', 'quantity', 'unit']
-                missing_columns = [col for col in required_columns if col not in df.columns]
-                
-                if missing_columns:
-                    form.add_error('excel_file', f'Quyidagi ustunlar topilmadi: {", ".join(missing_columns)}')
-                    return render(request, "products/productimport.html", {"form": form})
+                # Earlier imports this user never confirmed are superseded
+                discard_batches(ImportBatch.objects.filter(created_by=request.user, status__in=['staged', 'failed']))
                 
-                # Process data
-                products_data = []
-                for index, row in df.iterrows():
-                    # Skip empty rows or header-like rows
-                    if pd.isna(row['name']) or pd.isna(row['brand']) or row['name'] == 'Nomi' or row['brand'] == 'Brend':
-                        continue
-                    
-                    # Convert unit to lowercase and standardize
-                    unit = str(row['unit']).strip().lower()
-                    unit_mapping = {
-                        'kg': 'kg',
-                        'dona': 'dona', 
-                        'metr': 'metr',
-                        'kub': 'kub',
-                        'litr': 'litr'
-                    }
-                    unit = unit_mapping.get(unit, 'dona')  # default to 'dona'
-                    
-                    product_data = {
-                        'index': index + 2,  # Excel row number (starting from 2 for header)
-                        'name': str(row['name']).strip(),
-                        'brand': str(row['brand']).strip(),
-                        'price': float(row['price']),
-                        'quantity': float(row['quantity']),
-                        'unit': unit,
-                        'existing_product': None,
-                        'action': 'create'  # default action
-                    }
-                    
-                    # Check for existing product
-                    try:
-                        existing_product = Product.objects.get(
-                            Q(name__iexact=product_data['name']) & 
-                            Q(brand__iexact=product_data['brand'])
-                        )
-                        product_data['existing_product'] = {
-                            'id': existing_product.id,
-                            'name': existing_product.name,
-                            'brand': existing_product.brand,
-                            'price': float(existing_product.price),
-                            'quantity': float(existing_product.quantity),
-                            'unit': existing_product.unit
-                        }
-                        product_data['action'] = 'update'
-                    except Product.DoesNotExist:
-                        pass
-                    
-                    products_data.append(product_data)
+                # The file is read in the background; the preview page polls until its rows are staged
+                batch = enqueue_parse(excel_file, user=request.user)
+                request.session['import_batch_id'] = batch.id
                 
-                # Store in session for processing
-                request.session['import_data'] = json.dumps(products_data, default=str)
-                
-                return render(request, "products/productimport_preview.html", {
-                    "products_data": products_data,
-                    "total_products": len(products_data),
-                    "new_products": len([p for p in products_data if p['action'] == 'create']),
-                    "update_products": len([p for p in products_data if p['action'] == 'update'])
-                })
+                return redirect('import_preview', batch_id=batch.id)
                 
             except Exception as e:
                 form.add_error('excel_file', f'Excel faylni o‘qishda xatolik: {str(e)}')
@@ -171,59 +136,80 @@ def product_import(request):
     
     return render(request, "products/productimport.html", {"form": form})
 
+@login_required
+def import_preview(request, batch_id):
+    batch = get_object_or_404(ImportBatch, id=batch_id, created_by=request.user)
+    
+    # Only one page of staged rows is loaded; other statuses show the job's progress
+    paginator = Paginator(batch.rows.order_by('id'), IMPORT_PREVIEW_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    
+    return render(request, "products/productimport_preview.html", {
+        "batch": batch,
+        "page_obj": page_obj,
+        "products_data": [row.to_preview() for row in page_obj] if batch.status == 'staged' else [],
+        "total_products": batch.total_rows,
+        "new_products": batch.new_rows,
+        "update_products": batch.update_rows
+    })
+
+@login_required
+def import_status(request, batch_id):
+    """Progress of a background import, polled by the preview page"""
+    batch = get_object_or_404(ImportBatch, id=batch_id, created_by=request.user)
+    
+    # Queued or crashed jobs are picked up by this process if no worker has them
+    if batch.status in ('queued', 'apply_queued') or is_stale(batch):
+        start_worker()
+    
+    return JsonResponse({
+        'id': batch.id,
+        'status': batch.status,
+        'status_display': batch.get_status_display(),
+        'total_rows': batch.total_rows,
+        'new_rows': batch.new_rows,
+        'update_rows': batch.update_rows,
+        'processed_rows': batch.processed_rows,
+        'percent': batch.percent,
+        'error': batch.error,
+        'results': batch.results,
+    })
+
 @login_required
 @csrf_exempt
 def process_import(request):
     if request.method == 'POST':
         try:
-            # Get data from session
-            import_data_json = request.session.get('import_data')
-            if not import_data_json:
+            try:
+                payload = json.loads(request.body) if request.body else {}
+            except json.JSONDecodeError:
+                payload = {}
+            if not isinstance(payload, dict):
+                payload = {}
+            
+            # Staged batch from the preview page, or the one remembered in the session
+            batch_id = payload.get('batch_id') or request.session.get('import_batch_id')
+            batch = ImportBatch.objects.filter(id=batch_id, created_by=request.user, status='staged').first() if batch_id else None
+            if batch is None:
                 return JsonResponse({'success': False, 'error': 'Import ma\'lumotlari topilmadi'})
             
-            products_data = json.loads(import_data_json)
-            results = {
-                'created': 0,
-                'updated': 0,
-                'errors': 0,
-                'error_messages': []
-            }
+            # Import mode from the preview page: all-or-nothing (default) or best-effort
+            mode = payload.get('mode', MODE_ATOMIC)
+            if mode not in APPLY_MODES:
+                mode = MODE_ATOMIC
             
-            for product_data in products_data:
-                try:
-                    if product_data['action'] == 'update' and product_data['existing_product']:
-                        # Update existing product
-                        product = Product.objects.get(id=product_data['existing_product']['id'])
-                        product.price = product_data['price']
-                        product.quantity = float(product.quantity) + float(product_data['quantity'])
-                        product.unit = product_data['unit']
-                        product.save()
-                        results['updated'] += 1
-                        
-                    elif product_data['action'] == 'create':
-                        # Create new product
-                        Product.objects.create(
-                            name=product_data['name'],
-                            brand=product_data['brand'],
-                            price=product_data['price'],
-                            quantity=product_data['quantity'],
-                            unit=product_data['unit']
-                        )
-                        results['created'] += 1
-                        
-                except Exception as e:
-                    results['errors'] += 1
-                    results['error_messages'].append(
-                        f"Qator {product_data['index']}: {product_data['name']} - {str(e)}"
-                    )
+            # Applied in the background; the page polls import_status for progress and results
+            if not enqueue_apply(batch, mode=mode):
+                return JsonResponse({'success': False, 'error': 'Import allaqachon boshlangan'})
             
             # Clear session data
-            if 'import_data' in request.session:
-                del request.session['import_data']
+            if request.session.get('import_batch_id') == batch.id:
+                del request.session['import_batch_id']
             
             return JsonResponse({
                 'success': True,
-                'results': results
+                'queued': True,
+                'status_url': reverse('import_status', args=[batch.id])
             })
             
         except Exception as e:
@@ -358,96 +344,80 @@ def product_list(request):
     # Start with all products
     products = Product.objects.all()
     
-    # Apply search filter
+    # Apply search filter (full-text index, ranked when no explicit sort is chosen)
+    ranked = bool(search_query) and 'sort' not in request.GET
     if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) | 
-            Q(brand__icontains=search_query)
-        )
+        products = search_products(products, search_query)
     
     # Apply unit filter
     if unit_filter:
         products = products.filter(unit=unit_filter)
     
-    # Apply sorting
-    if sort_by in ['id', 'name', 'brand', 'price', 'quantity', 'created_at']:
-        if sort_order == 'desc':
-            sort_by = f'-{sort_by}'
-        products = products.order_by(sort_by)
+    if search_query or unit_filter:
+        # Totals and average of the filtered set in a single aggregate query
+        totals = products.aggregate(
+            total_products=Count('id'),
+            total_quantity=Sum('quantity'),
+            total_value=Sum(F('price') * F('quantity')),
+            avg_quantity=Avg('quantity'),
+        )
     else:
-        products = products.order_by('id')
-    
-    # Get statistics
-    total_products = products.count()
-    
-    # Convert Decimal to float safely
-    try:
-        total_quantity_result = products.aggregate(total=Sum('quantity'))['total']
-        total_quantity = float(total_quantity_result) if total_quantity_result else 0.0
-    except (TypeError, ValueError):
-        total_quantity = 0.0
-    
-    try:
-        total_value_result = products.aggregate(
-            total=Sum(F('price') * F('quantity'))
-        )['total']
-        total_value = float(total_value_result) if total_value_result else 0.0
-    except (TypeError, ValueError):
-        total_value = 0.0
-    
-    # Stock level statistics - simplified
-    try:
-        avg_quantity_result = products.aggregate(avg=Avg('quantity'))['avg']
-        avg_quantity = float(avg_quantity_result) if avg_quantity_result else 0.0
-    except (TypeError, ValueError):
-        avg_quantity = 0.0
+        # Whole catalog: read the precomputed snapshot row
+        snapshot = InventorySnapshot.current()
+        totals = {
+            'total_products': snapshot.product_count,
+            'total_quantity': snapshot.total_quantity,
+            'total_value': snapshot.total_value,
+            'avg_quantity': snapshot.avg_quantity,
+        }
+    total_products = totals['total_products']
+    total_quantity = float(totals['total_quantity'] or 0)
+    total_value = float(totals['total_value'] or 0)
+    avg_quantity = float(totals['avg_quantity'] or 0)
     
-    # Simple stock level calculation
     low_stock = 0
     medium_stock = 0
     high_stock = 0
     
     if avg_quantity > 0:
-        for product in products:
-            product_qty = float(product.quantity)
-            if product_qty < avg_quantity * 0.1:
-                low_stock += 1
-            elif product_qty < avg_quantity * 0.5:
-                medium_stock += 1
-            else:
-                high_stock += 1
-    
-    # Apply stock level filter after calculations
-    if stock_filter and avg_quantity > 0:
-        filtered_products = []
-        for product in products:
-            product_qty = float(product.quantity)
-            if stock_filter == 'low' and product_qty < avg_quantity * 0.1:
-                filtered_products.append(product)
-            elif stock_filter == 'medium' and product_qty >= avg_quantity * 0.1 and product_qty < avg_quantity * 0.5:
-                filtered_products.append(product)
-            elif stock_filter == 'high' and product_qty >= avg_quantity * 0.5:
-                filtered_products.append(product)
+        # Stock level as an SQL expression: below 10% of average is low,
+        # below 50% is medium, the rest is high
+        products = products.annotate(stock_level=stock_level_expression(avg_quantity))
         
-        # Convert back to queryset if needed, or use the filtered list
-        from django.db.models.expressions import Case, When, Value
-        from django.db.models import IntegerField
+        # Bucket counts in one conditional aggregation query
+        buckets = products.aggregate(
+            low=Count('id', filter=Q(stock_level='low')),
+            medium=Count('id', filter=Q(stock_level='medium')),
+            high=Count('id', filter=Q(stock_level='high')),
+        )
+        low_stock = buckets['low']
+        medium_stock = buckets['medium']
+        high_stock = buckets['high']
         
-        if filtered_products:
-            product_ids = [p.id for p in filtered_products]
-            preserved_order = Case(
-                *[When(id=id, then=Value(pos)) for pos, id in enumerate(product_ids)],
-                output_field=IntegerField()
-            )
-            products = products.filter(id__in=product_ids).order_by(preserved_order)
-        else:
-            products = products.none()
+        # Apply stock level filter as a plain WHERE clause
+        if stock_filter in ('low', 'medium', 'high'):
+            products = products.filter(stock_level=stock_filter)
+    
+    # Apply sorting
+    if ranked:
+        products = rank_products(products, search_query)
+    elif sort_by in ['id', 'name', 'brand', 'price', 'quantity', 'created_at']:
+        order_field = f'-{sort_by}' if sort_order == 'desc' else sort_by
+        products = products.order_by(order_field, 'id')
+    else:
+        sort_by = 'id'
+        products = products.order_by('id')
+    
+    # Only one page of products is loaded
+    paginator = Paginator(products, PRODUCTS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
     
     # Get unique units for filter
     units = Product.objects.values_list('unit', flat=True).distinct()
     
     context = {
-        'products': products,
+        'products': page_obj,
+        'page_obj': page_obj,
         'search_query': search_query,
         'unit_filter': unit_filter,
         'sort_by': sort_by,
@@ -465,63 +435,118 @@ def product_list(request):
     
     return render(request, "products/productlist.html", context)
 
+def empty_statistics_context(date_from=None, date_to=None):
+    return {
+        'total_products': 0,
+        'total_value': Decimal('0'),
+        'avg_price': Decimal('0'),
+        'avg_quantity': Decimal('0'),
+        'low_stock_count': 0,
+        'low_stock_percentage': Decimal('0'),
+        'high_value_count': 0,
+        'high_value_percentage': Decimal('0'),
+        'growth_products': 0,
+        'high_value_threshold': Decimal('0'),
+        'last_updated': timezone.now(),
+        'date_from': date_from,
+        'date_to': date_to,
+    }
+
 @login_required
 def statistics_view(request):
+    date_from, date_to = parse_date_range(request.GET)
+    
     try:
-        # Base query—adapt for filters if needed (e.g., date ranges via GET)
-        base_query = Product.objects.all()
-        total_products = base_query.count()
+        # Period filter on creation date; empty Q() means the whole catalog
+        period = Q()
+        if date_from:
+            period &= Q(created_at__date__gte=date_from)
+        if date_to:
+            period &= Q(created_at__date__lte=date_to)
         
-        if total_products == 0:
-            # Early grace for empty DB—log and return zeros with a nudge
-            print("Stats view: No products found—seed some data?")  # Console curiosity
-            context = {
-                'total_products': 0,
-                'total_value': Decimal('0'),
-                'avg_price': Decimal('0'),
-                'avg_quantity': Decimal('0'),
-                'low_stock_count': 0,
-                'low_stock_percentage': Decimal('0'),
-                'high_value_count': 0,
-                'high_value_percentage': Decimal('0'),
-                'growth_products': 0,
-                'high_value_threshold': Decimal('0'),
-                'last_updated': timezone.now(),
-            }
-            return render(request, "statistic/statistic.html", context)
-        
-        # Aggregates with Decimal safety: Convert Avg raw to Decimal
-        avg_price_raw = base_query.aggregate(avg=Avg('price'))['avg']
-        avg_price = Decimal(str(avg_price_raw)) if avg_price_raw is not None else Decimal('0')
-        avg_quantity_raw = base_query.aggregate(avg=Avg('quantity'))['avg']
-        avg_quantity = Decimal(str(avg_quantity_raw)) if avg_quantity_raw is not None else Decimal('0')
+        # Growth: selected period (or last 30 days) vs the period of the same length before it
+        window_end = date_to or timezone.now().date()
+        window_start = date_from or window_end - timedelta(days=30)
+        prev_window_start = window_start - (window_end - window_start) - timedelta(days=1)
         
-        # Total value: Sum(F('price') * F('quantity'))—Decimal-native
-        total_value_raw = base_query.aggregate(total=Sum(F('price') * F('quantity')))['total']
-        total_value = total_value_raw if total_value_raw is not None else Decimal('0')
+        growth_counts = {
+            'last_month_count': Count('id', filter=Q(
+                created_at__date__gte=window_start, created_at__date__lte=window_end
+            )),
+            'prev_month_count': Count('id', filter=Q(
+                created_at__date__gte=prev_window_start, created_at__date__lt=window_start
+            )),
+        }
         
-        # Low stock: Threshold as avg_quantity / Decimal('2')
-        low_threshold = avg_quantity / Decimal('2') if avg_quantity > 0 else Decimal('10')
-        low_stock_query = base_query.filter(quantity__lt=low_threshold)
-        low_stock_count = low_stock_query.count()
-        low_stock_percentage = (Decimal(str(low_stock_count)) / Decimal(str(total_products)) * Decimal('100')) if total_products > 0 else Decimal('0')
+        if date_from or date_to:
+            # Averages as scalar subqueries so thresholds are computed inside the same statement
+            period_products = Product.objects.filter(period).order_by()
+            avg_quantity_sub = Subquery(
+                period_products.annotate(g=Value(1)).values('g').annotate(a=Avg('quantity')).values('a')
+            )
+            avg_price_sub = Subquery(
+                period_products.annotate(g=Value(1)).values('g').annotate(a=Avg('price')).values('a')
+            )
+            # Low stock: below avg_quantity / 2 (10 when there is no average)
+            low_threshold = Coalesce(
+                NullIf(avg_quantity_sub, Value(0)) / Value(Decimal('2')),
+                Value(Decimal('10')),
+                output_field=DecimalField(),
+            )
+            # High value: above avg_price * 1.5 (10000 when there is no average)
+            high_threshold = Coalesce(
+                NullIf(avg_price_sub, Value(0)) * Value(Decimal('1.5')),
+                Value(Decimal('10000')),
+                output_field=DecimalField(),
+            )
+            
+            # All KPIs in one aggregate query
+            stats = Product.objects.aggregate(
+                total_products=Count('id', filter=period),
+                avg_price=Avg('price', filter=period),
+                avg_quantity=Avg('quantity', filter=period),
+                total_value=Sum(F('price') * F('quantity'), filter=period),
+                low_stock_count=Count('id', filter=period & Q(quantity__lt=low_threshold)),
+                high_value_count=Count('id', filter=period & Q(price__gt=high_threshold)),
+                max_updated=Max('updated_at', filter=period),
+                **growth_counts,
+            )
+        else:
+            # Whole catalog: totals and averages come from the snapshot row,
+            # only the threshold and growth counts need the Product table
+            snapshot = InventorySnapshot.current()
+            avg_quantity = snapshot.avg_quantity
+            avg_price = snapshot.avg_price
+            low_threshold = avg_quantity / Decimal('2') if avg_quantity > 0 else Decimal('10')
+            high_threshold = avg_price * Decimal('1.5') if avg_price > 0 else Decimal('10000')
+            
+            stats = Product.objects.aggregate(
+                low_stock_count=Count('id', filter=Q(quantity__lt=low_threshold)),
+                high_value_count=Count('id', filter=Q(price__gt=high_threshold)),
+                **growth_counts,
+            )
+            stats.update({
+                'total_products': snapshot.product_count,
+                'avg_price': avg_price,
+                'avg_quantity': avg_quantity,
+                'total_value': snapshot.total_value,
+                'max_updated': snapshot.last_updated,
+            })
         
-        # High value: Items > avg_price * Decimal('1.5')
-        high_threshold = avg_price * Decimal('1.5') if avg_price > 0 else Decimal('10000')
-        high_value_query = base_query.filter(price__gt=high_threshold)
-        high_value_count = high_value_query.count()
-        high_value_percentage = (Decimal(str(high_value_count)) / Decimal(str(total_products)) * Decimal('100')) if total_products > 0 else Decimal('0')
+        total_products = stats['total_products']
+        if total_products == 0:
+            print("Stats view: No products found—seed some data?")  # Console curiosity
+            return render(request, "statistic/statistic.html", empty_statistics_context(date_from, date_to))
         
-        # Growth: Products added last month vs previous—counts safe as int
-        last_month_start = timezone.now().date() - timedelta(days=30)
-        prev_month_start = last_month_start - timedelta(days=30)
-        last_month_count = base_query.filter(created_at__date__gte=last_month_start).count()
-        prev_month_count = base_query.filter(created_at__date__gte=prev_month_start, created_at__date__lt=last_month_start).count()
-        growth_products = last_month_count - prev_month_count
+        avg_price = Decimal(str(stats['avg_price'])) if stats['avg_price'] is not None else Decimal('0')
+        avg_quantity = Decimal(str(stats['avg_quantity'])) if stats['avg_quantity'] is not None else Decimal('0')
+        total_value = stats['total_value'] if stats['total_value'] is not None else Decimal('0')
+        high_threshold_value = avg_price * Decimal('1.5') if avg_price > 0 else Decimal('10000')
         
-        # Last updated: Max('updated_at')—now with imported Max
-        last_updated_raw = base_query.aggregate(max_updated=Max('updated_at'))['max_updated']
-        last_updated = last_updated_raw if last_updated_raw else timezone.now()
+        low_stock_count = stats['low_stock_count']
+        high_value_count = stats['high_value_count']
+        low_stock_percentage = Decimal(str(low_stock_count)) / Decimal(str(total_products)) * Decimal('100')
+        high_value_percentage = Decimal(str(high_value_count)) / Decimal(str(total_products)) * Decimal('100')
         
         context = {
             'total_products': total_products,
@@ -532,9 +557,11 @@ def statistics_view(request):
             'low_stock_percentage': low_stock_percentage,
             'high_value_count': high_value_count,
             'high_value_percentage': high_value_percentage,
-            'growth_products': growth_products,
-            'high_value_threshold': high_threshold,
-            'last_updated': last_updated,
+            'growth_products': stats['last_month_count'] - stats['prev_month_count'],
+            'high_value_threshold': high_threshold_value,
+            'last_updated': stats['max_updated'] or timezone.now(),
+            'date_from': date_from,
+            'date_to': date_to,
         }
         
         print(f"Stats view: Loaded {total_products} products, total value {total_value}")  # Console heartbeat for curiosity
@@ -542,19 +569,7 @@ def statistics_view(request):
     except Exception as e:
         # Graceful fallback—log the whisper, zeros for the canvas
         print(f"Stats view error: {e}")  # Your detective's notebook
-        context = {
-            'total_products': 0,
-            'total_value': Decimal('0'),
-            'avg_price': Decimal('0'),
-            'avg_quantity': Decimal('0'),
-            'low_stock_count': 0,
-            'low_stock_percentage': Decimal('0'),
-            'high_value_count': 0,
-            'high_value_percentage': Decimal('0'),
-            'growth_products': 0,
-            'high_value_threshold': Decimal('0'),
-            'last_updated': timezone.now(),
-        }
+        context = empty_statistics_context(date_from, date_to)
     
     return render(request, "statistic/statistic.html", context)
 
@@ -578,12 +593,10 @@ def product_create(request):
                 except IntegrityError:
                     form.add_error(None, "Bu mahsulot allaqachon mavjud")
             else:
-                # Check for existing product (case-insensitive)
-                try:
-                    duplicate_product = Product.objects.get(
-                        Q(name__iexact=name) & Q(brand__iexact=brand)
-                    )
-                    
+                # Check for existing product (case-insensitive, via lookup_key)
+                duplicate_product = Product.find_duplicate(name, brand)
+                
+                if duplicate_product:
                     # If product exists, show confirmation modal
                     return render(request, "products/productform.html", {
                         "form": form,
@@ -592,14 +605,13 @@ def product_create(request):
                         "duplicate_product": duplicate_product,
                         "show_modal": True
                     })
-                    
-                except Product.DoesNotExist:
-                    # No duplicate found, save normally
-                    try:
-                        form.save()
-                        return redirect('productlist')
-                    except IntegrityError:
-                        form.add_error(None, "Bu mahsulot allaqachon mavjud")
+                
+                # No duplicate found, save normally
+                try:
+                    form.save()
+                    return redirect('productlist')
+                except IntegrityError:
+                    form.add_error(None, "Bu mahsulot allaqachon mavjud")
     else:
         form = ProductForm()
     
@@ -621,11 +633,9 @@ def check_existing_product(request):
             brand = data.get('brand', '').strip()
             
             if name and brand:
-                try:
-                    # Case-insensitive search
-                    existing_product = Product.objects.get(
-                        Q(name__iexact=name) & Q(brand__iexact=brand)
-                    )
+                # Case-insensitive search
+                existing_product = Product.find_duplicate(name, brand)
+                if existing_product:
                     return JsonResponse({
                         'exists': True,
                         'product_id': existing_product.id,
@@ -635,8 +645,7 @@ def check_existing_product(request):
                         'quantity': str(existing_product.quantity),
                         'unit': existing_product.unit
                     })
-                except Product.DoesNotExist:
-                    return JsonResponse({'exists': False})
+                return JsonResponse({'exists': False})
             else:
                 return JsonResponse({'exists': False})
                 
@@ -696,8 +705,11 @@ def product_edit(request, id):
     if request.method == 'POST':
         form = ProductForm(request.POST, instance=product)
         if form.is_valid():
-            form.save()
-            return redirect('productlist')
+            try:
+                form.save()
+                return redirect('productlist')
+            except IntegrityError:
+                form.add_error(None, "Bu mahsulot allaqachon mavjud")
     else:
         form = ProductForm(instance=product)
     
@@ -714,8 +726,14 @@ def product_edit(request, id):
 def product_delete(request, id):
     product = get_object_or_404(Product, id=id)
     
+    error = None
     if request.method == 'POST':
-        product.delete()
-        return redirect('productlist')
+        try:
+            product.delete()
+        except ProtectedError:
+            # Sold products stay, so past orders and sales reports keep their lines
+            error = "Bu mahsulot sotuvlarda ishlatilgan, uni o'chirib bo'lmaydi"
+        else:
+            return redirect('productlist')
     
-    return render(request, "products/productdelete.html", {"product": product})
\ No newline at end of file
+    return render(request, "products/productdelete.html", {"product": product, "error": error})
\ No newline at end of file
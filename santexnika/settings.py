@@ -80,6 +80,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Bir nechta kassa bir vaqtda yozganda tranzaksiyalar "database is locked"
+            # xatosi o'rniga navbat kutadi
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -120,6 +126,10 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded files (import files waiting to be read by a background job)
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -133,3 +143,37 @@ LOGIN_REDIRECT_URL = '/'
 
 # Tizimdan chiqqandan keyin qaysi sahifaga
 LOGOUT_REDIRECT_URL = '/login/'
+
+# Tayyor export fayllari keshi: bir xil filtr va o'zgarmagan ma'lumot uchun fayl qayta yaratilmaydi.
+# Hajm shu chegaradan oshsa, eng uzoq ishlatilmagan fayllar o'chiriladi
+EXPORT_CACHE_DIR = MEDIA_ROOT / 'export_cache'
+EXPORT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# Tayyor PDF cheklar keshi: chek bir marta yaratiladi, keyin fayldan beriladi
+RECEIPT_CACHE_DIR = MEDIA_ROOT / 'receipts'
+RECEIPT_CACHE_MAX_BYTES = 500 * 1024 * 1024
+
+# Cheklar alohida jarayonlarda yaratiladi (0 bo'lsa so'rovning o'zida).
+# Navbatda shundan ko'p chek bo'lsa, oldindan yaratish o'tkazib yuboriladi
+RECEIPT_RENDER_WORKERS = 2
+RECEIPT_RENDER_QUEUE_MAX = 50
+RECEIPT_RENDER_TIMEOUT = 30
+
+# Chek QR kodlari keshi: xotirada eng ko'p shuncha rasm, diskda shu hajmgacha
+QR_MEMORY_CACHE_ITEMS = 512
+QR_CACHE_DIR = MEDIA_ROOT / 'qr'
+QR_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+# Mahsulot qidiruv indeksi (xotirada) bazadagi o'zgarishlarni necha soniyada bir tekshiradi
+TYPEAHEAD_REFRESH_SECONDS = 2
+
+# Import va export ishlarini veb-jarayon ichidagi fon oqimlarida bajarish.
+# False bo'lsa, ularni `python manage.py run_import_jobs --loop` va
+# `python manage.py run_export_jobs --loop` bajaradi
+BACKGROUND_JOBS_IN_PROCESS = True
+
+# Fon exportlari: bir vaqtda nechtasi ishlaydi, bitta foydalanuvchi nechtasini
+# navbatga qo'ya oladi va tayyor fayllar necha kun saqlanadi
+EXPORT_JOBS_MAX_RUNNING = 2
+EXPORT_JOBS_MAX_QUEUED_PER_USER = 5
+EXPORT_FILES_KEEP_DAYS = 7
@@ -1,13 +1,47 @@
 from django.contrib import admin
-from .models import Sale
+from .models import Order, OrderItem, DailySalesRollup
 
-@admin.register(Sale)
-class SaleAdmin(admin.ModelAdmin):
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    extra = 0
+    can_delete = False
+    # Lines are written by checkout together with the stock change; editing them here would skip it
+    readonly_fields = ['product', 'quantity', 'unit_price', 'total_price', 'final_price']
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
     list_display = [
-        'id', 'product', 'client', 'quantity', 'unit_price', 
-        'final_price', 'sale_date', 'seller'
+        'id', 'client', 'item_count', 'total_price', 'discount',
+        'final_price', 'payment_method', 'sale_date', 'seller'
     ]
     list_filter = ['sale_date', 'payment_method', 'seller']
-    search_fields = ['product__name', 'client__name', 'client__lname']
-    readonly_fields = ['sale_date']
-    date_hierarchy = 'sale_date'
\ No newline at end of file
+    search_fields = ['items__product__name', 'client__name', 'client__lname']
+    # Everything the daily rollup is keyed or summed on stays as checkout wrote it
+    readonly_fields = ['sale_date', 'seller', 'payment_method', 'discount', 'total_price', 'final_price', 'item_count']
+    date_hierarchy = 'sale_date'
+    inlines = [OrderItemInline]
+
+    def delete_queryset(self, request, queryset):
+        # One by one so Order.delete() takes each order out of the rollup
+        for order in queryset:
+            order.delete()
+
+
+@admin.register(DailySalesRollup)
+class DailySalesRollupAdmin(admin.ModelAdmin):
+    list_display = ['date', 'product', 'seller', 'payment_method', 'quantity', 'gross', 'discount', 'net', 'line_count']
+    list_filter = ['date', 'payment_method', 'seller']
+    search_fields = ['product__name']
+    list_select_related = ['product', 'seller']
+    date_hierarchy = 'date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
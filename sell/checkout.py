@@ -0,0 +1,134 @@
+"""
+Multi-item checkout.
+
+The whole basket is one transaction: products are read with one in_bulk
+query, stock is taken with conditional UPDATE ... SET quantity = quantity - n
+WHERE quantity >= n statements, and the basket becomes one Order whose
+lines are written with one bulk_create. If any line fails, nothing is saved.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from products.models import Product, InventorySnapshot
+from .models import Order, OrderItem, DailySalesRollup
+
+TWO_PLACES = Decimal('0.01')
+
+
+class CheckoutError(Exception):
+    """The basket was rejected; errors holds one message per problem"""
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(errors))
+
+
+def parse_items(product_ids, quantities, unit_prices):
+    """
+    Basket lines from the parallel POST lists as (product_id, quantity,
+    unit_price or None). Blank rows are skipped; malformed ones are errors.
+    """
+    items = []
+    errors = []
+    for product_id, quantity, unit_price in zip(product_ids, quantities, unit_prices):
+        product_id, quantity, unit_price = product_id.strip(), quantity.strip(), unit_price.strip()
+        if not product_id or not quantity:
+            continue
+        try:
+            product_id = int(product_id)
+            quantity = Decimal(quantity).quantize(TWO_PLACES)
+            unit_price = Decimal(unit_price).quantize(TWO_PLACES) if unit_price else None
+        except (ValueError, InvalidOperation):
+            errors.append("Miqdor yoki narx noto'g'ri formatda")
+            continue
+        if quantity <= 0:
+            errors.append("Miqdor 0 dan katta bo'lishi kerak")
+            continue
+        items.append((product_id, quantity, unit_price))
+
+    if errors:
+        raise CheckoutError(errors)
+    return items
+
+
+def checkout(items, client, discount, payment_method, seller):
+    """
+    Sell a basket of (product_id, quantity, unit_price or None) lines.
+
+    Returns the created Order, or raises CheckoutError after rolling
+    everything back.
+    """
+    if not items:
+        raise CheckoutError(["Hech qanday mahsulot saqlanmadi. Miqdor va mahsulotni tekshiring."])
+    # Stored with two places; quantized here so the returned Order renders
+    # the same as one read back from the database
+    discount = Decimal(discount).quantize(TWO_PLACES)
+
+    with transaction.atomic():
+        products = Product.objects.in_bulk({product_id for product_id, _, _ in items})
+        missing = sorted({product_id for product_id, _, _ in items if product_id not in products})
+        if missing:
+            raise CheckoutError([f"Mahsulot {product_id} topilmadi" for product_id in missing])
+
+        # Total per product, so a product listed twice is checked against its stock once
+        wanted = {}
+        for product_id, quantity, _ in items:
+            wanted[product_id] = wanted.get(product_id, Decimal('0')) + quantity
+
+        # Conditional decrement: the row changes only if enough stock is left at that moment.
+        # Ascending ID order keeps concurrent baskets from deadlocking on each other's rows.
+        now = timezone.now()
+        short = []
+        for product_id in sorted(wanted):
+            updated = Product.objects.filter(pk=product_id, quantity__gte=wanted[product_id]).update(
+                quantity=F('quantity') - wanted[product_id],
+                updated_at=now,
+            )
+            if not updated:
+                short.append(product_id)
+
+        if short:
+            available = dict(Product.objects.filter(pk__in=short).values_list('id', 'quantity'))
+            raise CheckoutError([
+                f"Mahsulot '{products[product_id].name}' uchun yetarli miqdor yo'q. Mavjud: {available.get(product_id, 0)}"
+                for product_id in short
+            ])
+
+        lines = []
+        for product_id, quantity, unit_price in items:
+            product = products[product_id]
+            unit_price = product.price if unit_price is None else unit_price
+            total_price = (quantity * unit_price).quantize(TWO_PLACES)
+            discount_amount = (total_price * discount / Decimal('100')).quantize(TWO_PLACES)
+            lines.append(OrderItem(
+                product=product,
+                quantity=quantity,
+                unit_price=unit_price,
+                total_price=total_price,
+                final_price=total_price - discount_amount,
+            ))
+
+        order = Order.objects.create(
+            client=client,
+            discount=discount,
+            payment_method=payment_method,
+            seller=seller,
+            total_price=sum(line.total_price for line in lines),
+            final_price=sum(line.final_price for line in lines),
+            item_count=len(lines),
+            sale_date=now,
+        )
+        for line in lines:
+            line.order = order
+        OrderItem.objects.bulk_create(lines)
+        DailySalesRollup.apply_lines(order, lines)
+
+        # The updates above bypass Product.save(), so the snapshot is shifted here
+        InventorySnapshot.apply_delta(
+            quantity=-sum(wanted.values()),
+            value=-sum(products[product_id].price * quantity for product_id, quantity in wanted.items()),
+        )
+
+    return order
@@ -0,0 +1,31 @@
+"""Sales ledger exports (CSV / JSON lines), streamed from a server-side cursor"""
+from products.exporting import iter_records, EXPORT_CHUNK_SIZE
+
+# (output field, OrderItem lookup) in export order
+SALE_COLUMNS = [
+    ('id', 'id'),
+    ('order_id', 'order_id'),
+    ('sale_date', 'order__sale_date'),
+    ('product_id', 'product_id'),
+    ('product_name', 'product__name'),
+    ('product_brand', 'product__brand'),
+    ('unit', 'product__unit'),
+    ('quantity', 'quantity'),
+    ('unit_price', 'unit_price'),
+    ('total_price', 'total_price'),
+    ('discount', 'order__discount'),
+    ('final_price', 'final_price'),
+    ('payment_method', 'order__payment_method'),
+    ('client_id', 'order__client_id'),
+    ('client_name', 'order__client__name'),
+    ('client_lname', 'order__client__lname'),
+    ('seller', 'order__seller__username'),
+]
+
+SALE_FIELDS = [field for field, _ in SALE_COLUMNS]
+
+
+def iter_sale_records(items, chunk_size=EXPORT_CHUNK_SIZE):
+    """Sale lines oldest first, with order, product, client and seller joined in the same query"""
+    lookups = [lookup for _, lookup in SALE_COLUMNS]
+    return iter_records(items.order_by('id'), lookups, chunk_size=chunk_size)
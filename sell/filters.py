@@ -0,0 +1,109 @@
+"""Query-string filters for the sales ledger (list and exports)"""
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from products.filters import parse_date_range
+from products.models import Product
+from products.search import search_products
+
+from .models import Order, OrderItem
+
+# Filters the sales list and its exports share
+SALE_FILTER_PARAMS = ['search', 'unit', 'product', 'seller', 'client', 'payment_method', 'date_from', 'date_to']
+
+
+def start_of(day):
+    """Local midnight at the start of day, as an aware datetime"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def date_bounds(date_from, date_to):
+    """
+    Half-open [start, end) datetimes for a date range, either end optional.
+    Comparing sale_date itself, not sale_date's date, keeps the
+    (sale_date, id) index usable.
+    """
+    start = start_of(date_from) if date_from else None
+    end = start_of(date_to + timedelta(days=1)) if date_to else None
+    return start, end
+
+
+def parse_id(params, key):
+    """Integer ID from the query string, or None when missing or malformed"""
+    value = params.get(key, '').strip()
+    return int(value) if value.isdigit() else None
+
+
+def filter_lines_by_product(items, params):
+    """Sale lines narrowed by the product filters: search, unit and product ID"""
+    search_query = params.get('search', '')
+    if search_query:
+        items = items.filter(product__in=search_products(Product.objects.all(), search_query).values('id'))
+
+    unit_filter = params.get('unit', '')
+    if unit_filter:
+        items = items.filter(product__unit=unit_filter)
+
+    product_id = parse_id(params, 'product')
+    if product_id is not None:
+        items = items.filter(product_id=product_id)
+
+    return items
+
+
+def filter_sales(params):
+    """
+    Sale lines matching the product search and unit filters (as on the
+    product list), a product, seller, client or payment method, and an
+    optional date_from / date_to range on sale_date.
+    """
+    items = filter_lines_by_product(OrderItem.objects.all(), params)
+
+    seller_id = parse_id(params, 'seller')
+    if seller_id is not None:
+        items = items.filter(order__seller_id=seller_id)
+
+    client_id = parse_id(params, 'client')
+    if client_id is not None:
+        items = items.filter(order__client_id=client_id)
+
+    payment_method = params.get('payment_method', '')
+    if payment_method:
+        items = items.filter(order__payment_method=payment_method)
+
+    start, end = date_bounds(*parse_date_range(params))
+    if start:
+        items = items.filter(order__sale_date__gte=start)
+    if end:
+        items = items.filter(order__sale_date__lt=end)
+
+    return items
+
+
+def filter_orders(params):
+    """Orders matching the same filters as filter_sales, on at least one of their lines"""
+    orders = Order.objects.all()
+
+    if any(params.get(key, '') for key in ('search', 'unit', 'product')):
+        orders = orders.filter(id__in=filter_lines_by_product(OrderItem.objects.all(), params).values('order_id'))
+
+    seller_id = parse_id(params, 'seller')
+    if seller_id is not None:
+        orders = orders.filter(seller_id=seller_id)
+
+    client_id = parse_id(params, 'client')
+    if client_id is not None:
+        orders = orders.filter(client_id=client_id)
+
+    payment_method = params.get('payment_method', '')
+    if payment_method:
+        orders = orders.filter(payment_method=payment_method)
+
+    start, end = date_bounds(*parse_date_range(params))
+    if start:
+        orders = orders.filter(sale_date__gte=start)
+    if end:
+        orders = orders.filter(sale_date__lt=end)
+
+    return orders
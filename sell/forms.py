@@ -1,6 +1,6 @@
 from django import forms
 from decimal import Decimal
-from .models import Sale
+from .models import Order
 from clients.models import Account
 from products.models import Product
 
@@ -35,7 +35,7 @@ class SaleItemForm(forms.Form):
 
 class SaleForm(forms.ModelForm):
     class Meta:
-        model = Sale
+        model = Order
         fields = ['client', 'discount', 'payment_method']
         widgets = {
             'client': forms.Select(attrs={
@@ -0,0 +1,48 @@
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from sell.models import DailySalesRollup
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily sales rollup from the order lines and report drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Only compare the stored rollup with fresh totals, do not rewrite it",
+        )
+
+    def handle(self, *args, **options):
+        fresh = {
+            (row['date'], row['product_id'], row['order__seller_id'], row['order__payment_method']): row
+            for row in DailySalesRollup.compute()
+        }
+        stored = {
+            (row.date, row.product_id, row.seller_id, row.payment_method): row
+            for row in DailySalesRollup.objects.all()
+        }
+
+        drift = []
+        for key in sorted(stored.keys() - fresh.keys(), key=str):
+            drift.append(f"{key}: stored row has no sales")
+        for key in sorted(fresh.keys() - stored.keys(), key=str):
+            drift.append(f"{key}: row is missing")
+        for key in stored.keys() & fresh.keys():
+            for field in ('quantity', 'gross', 'net'):
+                stored_value = Decimal(str(getattr(stored[key], field)))
+                fresh_value = Decimal(str(fresh[key][field]))
+                # SQLite keeps decimals as floating point, so allow rounding noise
+                if abs(stored_value - fresh_value) > Decimal('0.01'):
+                    drift.append(f"{key} {field}: stored {stored_value}, actual {fresh_value}")
+
+        for line in drift:
+            self.stdout.write(self.style.WARNING(f"Drift: {line}"))
+
+        if options['check']:
+            if not drift:
+                self.stdout.write(self.style.SUCCESS("Rollup is up to date"))
+            return
+
+        count = DailySalesRollup.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rollup rebuilt: {count} rows"))
@@ -0,0 +1,147 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:19
+
+from datetime import timedelta
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import migrations, models
+
+# Sale rows of one old checkout were saved one by one, a moment apart
+GROUP_WINDOW = timedelta(seconds=5)
+BATCH_SIZE = 1000
+
+
+def reset_sequences(schema_editor, model_list):
+    # Rows are inserted with explicit IDs; move the sequences past them (no-op on SQLite)
+    for sql in schema_editor.connection.ops.sequence_reset_sql(no_style(), model_list):
+        schema_editor.execute(sql)
+
+
+def group_sales(apps, schema_editor):
+    """
+    One Order per run of Sale rows with the same client, discount, payment
+    method and seller, saved within GROUP_WINDOW of the run's first row.
+
+    Each Order takes the ID of its first Sale and each line keeps its Sale
+    ID, so printed receipts and QR codes of existing sales still resolve.
+    """
+    Sale = apps.get_model('sell', 'Sale')
+    Order = apps.get_model('sell', 'Order')
+    OrderItem = apps.get_model('sell', 'OrderItem')
+
+    orders, items = [], []
+    order = group = None
+    for sale in Sale.objects.order_by('id').iterator(chunk_size=2000):
+        key = (sale.client_id, sale.discount, sale.payment_method, sale.seller_id)
+        if order is None or key != group or sale.sale_date - order.sale_date > GROUP_WINDOW:
+            if len(orders) >= BATCH_SIZE:
+                Order.objects.bulk_create(orders)
+                OrderItem.objects.bulk_create(items)
+                orders, items = [], []
+            order = Order(
+                id=sale.id,
+                client_id=sale.client_id,
+                discount=sale.discount,
+                payment_method=sale.payment_method,
+                seller_id=sale.seller_id,
+                sale_date=sale.sale_date,
+            )
+            group = key
+            orders.append(order)
+        order.total_price += sale.total_price
+        order.final_price += sale.final_price
+        order.item_count += 1
+        items.append(OrderItem(
+            id=sale.id,
+            order_id=order.id,
+            product_id=sale.product_id,
+            quantity=sale.quantity,
+            unit_price=sale.unit_price,
+            total_price=sale.total_price,
+            final_price=sale.final_price,
+        ))
+    Order.objects.bulk_create(orders)
+    OrderItem.objects.bulk_create(items)
+
+    reset_sequences(schema_editor, [Order, OrderItem])
+
+
+def split_orders(apps, schema_editor):
+    Sale = apps.get_model('sell', 'Sale')
+    Order = apps.get_model('sell', 'Order')
+
+    for order in Order.objects.prefetch_related('items').iterator(chunk_size=500):
+        Sale.objects.bulk_create([
+            Sale(
+                id=item.id,
+                client_id=order.client_id,
+                product_id=item.product_id,
+                quantity=item.quantity,
+                unit_price=item.unit_price,
+                total_price=item.total_price,
+                discount=order.discount,
+                final_price=item.final_price,
+                payment_method=order.payment_method,
+                seller_id=order.seller_id,
+            )
+            for item in order.items.all()
+        ])
+        # sale_date is auto_now_add, so the original time is written afterwards
+        Sale.objects.filter(id__in=[item.id for item in order.items.all()]).update(sale_date=order.sale_date)
+
+    reset_sequences(schema_editor, [Sale])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0001_initial'),
+        ('products', '0008_exportjob'),
+        ('sell', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('discount', models.DecimalField(decimal_places=2, default=0, max_digits=5, verbose_name='Chegirma (%)')),
+                ('payment_method', models.CharField(choices=[('cash', 'Naqd'), ('card', 'Karta'), ('transfer', "O'tkazma")], default='cash', max_length=10, verbose_name="To'lov usuli")),
+                ('total_price', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Jami narx')),
+                ('final_price', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Yakuniy narx')),
+                ('item_count', models.PositiveIntegerField(default=0, verbose_name='Mahsulotlar soni')),
+                ('sale_date', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Sotilgan sana')),
+                ('client', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='clients.account', verbose_name='Mijoz')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Sotuvchi')),
+            ],
+            options={
+                'verbose_name': 'Sotuv',
+                'verbose_name_plural': 'Sotuvlar',
+                'ordering': ['-sale_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Miqdor')),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Narx')),
+                ('total_price', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Jami narx')),
+                ('final_price', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Yakuniy narx')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='sell.order', verbose_name='Sotuv')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.product', verbose_name='Mahsulot')),
+            ],
+            options={
+                'verbose_name': 'Sotuv qatori',
+                'verbose_name_plural': 'Sotuv qatorlari',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.RunPython(group_sales, split_orders),
+        migrations.DeleteModel(
+            name='Sale',
+        ),
+    ]
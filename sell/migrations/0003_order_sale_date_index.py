@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0001_initial'),
+        ('sell', '0002_order'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-sale_date', '-id'], name='sell_order_sale_date_id_idx'),
+        ),
+    ]
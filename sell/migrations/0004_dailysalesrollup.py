@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def build_rollup(apps, schema_editor):
+    OrderItem = apps.get_model('sell', 'OrderItem')
+    DailySalesRollup = apps.get_model('sell', 'DailySalesRollup')
+    rows = (
+        OrderItem.objects
+        .annotate(date=TruncDate('order__sale_date'))
+        .values('date', 'product_id', 'order__seller_id', 'order__payment_method')
+        .annotate(quantity=Sum('quantity'), gross=Sum('total_price'), net=Sum('final_price'), line_count=Count('id'))
+        .order_by()
+    )
+    DailySalesRollup.objects.bulk_create([
+        DailySalesRollup(
+            date=row['date'],
+            product_id=row['product_id'],
+            seller_id=row['order__seller_id'],
+            payment_method=row['order__payment_method'],
+            quantity=row['quantity'],
+            gross=row['gross'],
+            discount=row['gross'] - row['net'],
+            net=row['net'],
+            line_count=row['line_count'],
+        )
+        for row in rows.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_exportjob'),
+        ('sell', '0003_order_sale_date_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Sana')),
+                ('payment_method', models.CharField(choices=[('cash', 'Naqd'), ('card', 'Karta'), ('transfer', "O'tkazma")], max_length=10, verbose_name="To'lov usuli")),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Miqdor')),
+                ('gross', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Jami narx')),
+                ('discount', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Chegirma')),
+                ('net', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Yakuniy narx')),
+                ('line_count', models.IntegerField(default=0, verbose_name='Qatorlar soni')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.product', verbose_name='Mahsulot')),
+                ('seller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Sotuvchi')),
+            ],
+            options={
+                'verbose_name': 'Kunlik sotuv hisobi',
+                'verbose_name_plural': 'Kunlik sotuv hisoblari',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'product', 'seller', 'payment_method'), name='sell_rollup_unique_key')],
+            },
+        ),
+        migrations.RunPython(build_rollup, migrations.RunPython.noop),
+    ]
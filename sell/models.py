@@ -1,99 +1,270 @@
-from django.db import models
-from django.contrib.auth.models import User
-from django.core.exceptions import ValidationError
 from decimal import Decimal
+from django.db import models, transaction, IntegrityError
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.contrib.auth.models import User
+from django.utils import timezone
 from clients.models import Account
 from products.models import Product
 
-class Sale(models.Model):
+
+class Order(models.Model):
+    """
+    One checkout: client, discount, payment and seller are stored once here,
+    with the basket lines in OrderItem. Totals are kept on the header so
+    revenue sums read one row per order instead of one per line.
+    """
     PAYMENT_METHODS = [
         ('cash', 'Naqd'),
         ('card', 'Karta'),
         ('transfer', "O'tkazma"),
     ]
-    
+
     client = models.ForeignKey(
-        Account, 
-        on_delete=models.SET_NULL, 
-        null=True, 
-        blank=True, 
+        Account,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
         verbose_name="Mijoz"
     )
+    discount = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        default=0,
+        verbose_name="Chegirma (%)"
+    )
+    payment_method = models.CharField(
+        max_length=10,
+        choices=PAYMENT_METHODS,
+        default='cash',
+        verbose_name="To'lov usuli"
+    )
+    seller = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Sotuvchi"
+    )
+    total_price = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name="Jami narx"
+    )
+    final_price = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name="Yakuniy narx"
+    )
+    item_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Mahsulotlar soni"
+    )
+    sale_date = models.DateTimeField(
+        default=timezone.now,
+        verbose_name="Sotilgan sana"
+    )
+
+    class Meta:
+        verbose_name = "Sotuv"
+        verbose_name_plural = "Sotuvlar"
+        ordering = ['-sale_date']
+        indexes = [
+            # Keyset pagination of the sales list walks (sale_date, id) newest first
+            models.Index(fields=['-sale_date', '-id'], name='sell_order_sale_date_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"Sotuv #{self.id}"
+
+    @property
+    def discount_amount(self):
+        return self.total_price - self.final_price
+
+    def save(self, *args, **kwargs):
+        updating = not self._state.adding
+        super().save(*args, **kwargs)
+        if updating:
+            # The cached PDF receipt shows the old details
+            from .receipts import invalidate
+            order_id = self.pk
+            transaction.on_commit(lambda: invalidate(order_id))
+
+    def delete(self, *args, **kwargs):
+        from .receipts import invalidate
+        order_id = self.pk
+        with transaction.atomic():
+            DailySalesRollup.apply_lines(self, list(self.items.all()), sign=-1)
+            result = super().delete(*args, **kwargs)
+            transaction.on_commit(lambda: invalidate(order_id))
+        return result
+
+
+class OrderItem(models.Model):
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='items',
+        verbose_name="Sotuv"
+    )
+    # Protected: the order header keeps the line's totals, so the line must stay
     product = models.ForeignKey(
-        Product, 
-        on_delete=models.CASCADE, 
+        Product,
+        on_delete=models.PROTECT,
         verbose_name="Mahsulot"
     )
     quantity = models.DecimalField(
-        max_digits=10, 
-        decimal_places=2, 
+        max_digits=10,
+        decimal_places=2,
         verbose_name="Miqdor"
     )
     unit_price = models.DecimalField(
-        max_digits=10, 
-        decimal_places=2, 
+        max_digits=10,
+        decimal_places=2,
         verbose_name="Narx"
     )
     total_price = models.DecimalField(
-        max_digits=10, 
-        decimal_places=2, 
+        max_digits=12,
+        decimal_places=2,
         verbose_name="Jami narx"
     )
-    discount = models.DecimalField(
-        max_digits=5, 
-        decimal_places=2, 
-        default=0, 
-        verbose_name="Chegirma (%)"
-    )
     final_price = models.DecimalField(
-        max_digits=10, 
-        decimal_places=2, 
+        max_digits=12,
+        decimal_places=2,
         verbose_name="Yakuniy narx"
     )
-    payment_method = models.CharField(
-        max_length=10, 
-        choices=PAYMENT_METHODS, 
-        default='cash', 
-        verbose_name="To'lov usuli"
+
+    class Meta:
+        verbose_name = "Sotuv qatori"
+        verbose_name_plural = "Sotuv qatorlari"
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.product.name} - {self.quantity} {self.product.unit}"
+
+
+class DailySalesRollup(models.Model):
+    """
+    Sales totals per day, product, seller and payment method, for reports.
+
+    Kept up to date by checkout() and Order.delete(); orders changed any
+    other way (queryset update()/delete(), raw SQL) bypass it, so run the
+    rebuild_sales_rollup command after bulk changes.
+    """
+    date = models.DateField(verbose_name="Sana")
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.PROTECT,
+        verbose_name="Mahsulot"
     )
     seller = models.ForeignKey(
-        User, 
-        on_delete=models.CASCADE, 
+        User,
+        on_delete=models.CASCADE,
         verbose_name="Sotuvchi"
     )
-    sale_date = models.DateTimeField(
-        auto_now_add=True, 
-        verbose_name="Sotilgan sana"
+    payment_method = models.CharField(
+        max_length=10,
+        choices=Order.PAYMENT_METHODS,
+        verbose_name="To'lov usuli"
     )
-    
+    quantity = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name="Miqdor")
+    gross = models.DecimalField(max_digits=18, decimal_places=2, default=0, verbose_name="Jami narx")
+    discount = models.DecimalField(max_digits=18, decimal_places=2, default=0, verbose_name="Chegirma")
+    net = models.DecimalField(max_digits=18, decimal_places=2, default=0, verbose_name="Yakuniy narx")
+    line_count = models.IntegerField(default=0, verbose_name="Qatorlar soni")
+
     class Meta:
-        verbose_name = "Sotuv"
-        verbose_name_plural = "Sotuvlar"
-        ordering = ['-sale_date']
-    
+        verbose_name = "Kunlik sotuv hisobi"
+        verbose_name_plural = "Kunlik sotuv hisoblari"
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'product', 'seller', 'payment_method'],
+                name='sell_rollup_unique_key',
+            ),
+        ]
+
     def __str__(self):
-        return f"{self.product.name} - {self.quantity} {self.product.unit}"
-    
-    def save(self, *args, **kwargs):
-        # Calculate total price
-        self.total_price = self.quantity * self.unit_price
-        
-        # Apply discount
-        discount_amount = (self.total_price * self.discount) / Decimal('100')
-        self.final_price = self.total_price - discount_amount
-        
-        # Stock validation and update
-        if self.pk:  # Updating
-            old_sale = Sale.objects.get(pk=self.pk)
-            available = self.product.quantity + old_sale.quantity
-            if self.quantity > available:
-                raise ValidationError(f"Mahsulot '{self.product.name}' uchun yetarli miqdor yo'q. Mavjud: {self.product.quantity}")
-            quantity_diff = self.quantity - old_sale.quantity
-            self.product.quantity -= quantity_diff
-        else:  # Creating new
-            if self.quantity > self.product.quantity:
-                raise ValidationError(f"Mahsulot '{self.product.name}' uchun yetarli miqdor yo'q. Mavjud: {self.product.quantity}")
-            self.product.quantity -= self.quantity
-        
-        self.product.save()
-        super().save(*args, **kwargs)
\ No newline at end of file
+        return f"{self.date} - {self.product_id}: {self.net} so'm"
+
+    @classmethod
+    def compute(cls):
+        """Rollup rows computed from scratch over OrderItem, one dict per key"""
+        return (
+            OrderItem.objects
+            .annotate(date=TruncDate('order__sale_date'))
+            .values('date', 'product_id', 'order__seller_id', 'order__payment_method')
+            .annotate(
+                quantity=Sum('quantity'),
+                gross=Sum('total_price'),
+                net=Sum('final_price'),
+                line_count=Count('id'),
+            )
+            .order_by()
+        )
+
+    @classmethod
+    def rebuild(cls, batch_size=1000):
+        """Replace every rollup row with fresh totals; returns the number of rows"""
+        with transaction.atomic():
+            cls.objects.all().delete()
+            rows = [
+                cls(
+                    date=row['date'],
+                    product_id=row['product_id'],
+                    seller_id=row['order__seller_id'],
+                    payment_method=row['order__payment_method'],
+                    quantity=row['quantity'],
+                    gross=row['gross'],
+                    discount=row['gross'] - row['net'],
+                    net=row['net'],
+                    line_count=row['line_count'],
+                )
+                for row in cls.compute().iterator()
+            ]
+            cls.objects.bulk_create(rows, batch_size=batch_size)
+        return len(rows)
+
+    @classmethod
+    def apply_lines(cls, order, lines, sign=1):
+        """
+        Add (sign=1) or remove (sign=-1) an order's lines, with one
+        UPDATE ... SET x = x + delta per product the order touches.
+        """
+        date = timezone.localdate(order.sale_date)
+        totals = {}
+        for line in lines:
+            total = totals.setdefault(line.product_id, {
+                'quantity': Decimal('0'), 'gross': Decimal('0'), 'net': Decimal('0'), 'line_count': 0,
+            })
+            total['quantity'] += line.quantity
+            total['gross'] += line.total_price
+            total['net'] += line.final_price
+            total['line_count'] += 1
+
+        for product_id, total in totals.items():
+            key = {
+                'date': date,
+                'product_id': product_id,
+                'seller_id': order.seller_id,
+                'payment_method': order.payment_method,
+            }
+            delta = {
+                'quantity': sign * total['quantity'],
+                'gross': sign * total['gross'],
+                'discount': sign * (total['gross'] - total['net']),
+                'net': sign * total['net'],
+                'line_count': sign * total['line_count'],
+            }
+            increments = {field: F(field) + value for field, value in delta.items()}
+            if cls.objects.filter(**key).update(**increments):
+                continue
+            try:
+                # First sale for this key; a concurrent checkout may create it first
+                with transaction.atomic():
+                    cls.objects.create(**key, **delta)
+            except IntegrityError:
+                cls.objects.filter(**key).update(**increments)
+
+        if sign < 0:
+            cls.objects.filter(date=date, seller_id=order.seller_id, line_count__lte=0).delete()
@@ -0,0 +1,67 @@
+"""
+Keyset pagination for the sales list.
+
+Pages are addressed by the (sale_date, id) of the row next to them instead
+of an OFFSET, so every page is one index range scan however deep it is,
+and new sales arriving meanwhile do not shift rows between pages.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_cursor(order):
+    """Opaque cursor for an order: microseconds since the epoch and ID"""
+    delta = order.sale_date - EPOCH
+    microseconds = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    return f"{microseconds}-{order.id}"
+
+
+def decode_cursor(value):
+    """(sale_date, id) from a cursor, or None when it is missing or malformed"""
+    microseconds, _, order_id = (value or '').partition('-')
+    if not microseconds.isdigit() or not order_id.isdigit():
+        return None
+    return EPOCH + timedelta(microseconds=int(microseconds)), int(order_id)
+
+
+class KeysetPage:
+    def __init__(self, rows, has_next, has_previous):
+        self.rows = rows
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = encode_cursor(rows[-1]) if has_next and rows else None
+        self.previous_cursor = encode_cursor(rows[0]) if has_previous and rows else None
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def keyset_page(orders, params, per_page):
+    """
+    One page of orders, newest first. params may hold 'after' (the page
+    following a cursor) or 'before' (the page preceding it).
+    """
+    after = decode_cursor(params.get('after'))
+    before = decode_cursor(params.get('before')) if after is None else None
+
+    if before is not None:
+        sale_date, order_id = before
+        rows = list(
+            orders.filter(Q(sale_date__gt=sale_date) | Q(sale_date=sale_date, id__gt=order_id))
+            .order_by('sale_date', 'id')[:per_page + 1]
+        )
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        return KeysetPage(rows, has_next=True, has_previous=has_previous)
+
+    if after is not None:
+        sale_date, order_id = after
+        orders = orders.filter(Q(sale_date__lt=sale_date) | Q(sale_date=sale_date, id__lt=order_id))
+    rows = list(orders.order_by('-sale_date', '-id')[:per_page + 1])
+    return KeysetPage(rows[:per_page], has_next=len(rows) > per_page, has_previous=after is not None)
@@ -0,0 +1,112 @@
+"""
+QR codes for receipt links, generated once per link and format.
+
+A QR image is a pure function of the text it encodes, so it is keyed by
+the hash of that text and format and kept in a bounded in-process LRU
+and in QR_CACHE_DIR on disk. The same key is the response's strong ETag.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+
+import qrcode
+import qrcode.image.svg
+from django.conf import settings
+
+from products.export_cache import evict
+
+QR_CONTENT_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+DEFAULT_MEMORY_ITEMS = 512
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+
+class LRUCache:
+    """Thread-safe mapping that keeps the max_items most recently used entries"""
+    def __init__(self, max_items):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+
+memory_cache = LRUCache(getattr(settings, 'QR_MEMORY_CACHE_ITEMS', DEFAULT_MEMORY_ITEMS))
+
+
+def cache_dir():
+    path = Path(getattr(settings, 'QR_CACHE_DIR', Path(settings.MEDIA_ROOT) / 'qr'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def qr_key(data, image_format):
+    return hashlib.sha256(f"{image_format}:{data}".encode('utf-8')).hexdigest()[:32]
+
+
+def make_qr(data, image_format):
+    """Encode data as a QR image: PNG, or SVG as a single compact path"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+        image_factory=qrcode.image.svg.SvgPathImage if image_format == 'svg' else None,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    buffer = BytesIO()
+    if image_format == 'svg':
+        qr.make_image().save(buffer)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def get_qr(data, image_format='png'):
+    """(image bytes, key) for data, from memory, then disk, then generated"""
+    key = qr_key(data, image_format)
+    image = memory_cache.get(key)
+    if image is not None:
+        return image, key
+
+    path = cache_dir() / f"{key}.{image_format}"
+    try:
+        image = path.read_bytes()
+    except FileNotFoundError:
+        image = make_qr(data, image_format)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir(), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as output:
+                output.write(image)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        evict(
+            max_bytes=getattr(settings, 'QR_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES),
+            keep=path,
+            directory=cache_dir(),
+        )
+
+    memory_cache.set(key, image)
+    return image, key
@@ -0,0 +1,289 @@
+"""
+PDF receipts, rendered once and served from an on-disk cache.
+
+A cached file is named after its order and the hash of the HTML it was
+rendered from, so anything that changes the receipt (an edited order, a
+renamed product, a new template) gives a new file instead of a stale one.
+Older versions of an order's receipt are removed when a new one is
+written or the order is saved; the directory is kept under
+RECEIPT_CACHE_MAX_BYTES by evicting the oldest renders first.
+
+xhtml2pdf is CPU-bound and holds the GIL, so rendering runs in a small
+process pool (RECEIPT_RENDER_WORKERS) instead of the request thread. New
+orders are queued for rendering right after checkout commits, so the
+download usually finds a ready file. Each receipt version is rendered at
+most once at a time: a download that arrives while its pre-render is
+still running waits for that same render.
+"""
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone as dt_timezone
+from functools import partial
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from xhtml2pdf import pisa
+
+from products.export_cache import ExportArtifact, evict
+
+RECEIPT_TEMPLATE = 'sell/receipt_pdf.html'
+PDF_CONTENT_TYPE = 'application/pdf'
+DEFAULT_MAX_BYTES = 500 * 1024 * 1024
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_MAX = 50
+DEFAULT_TIMEOUT = 30
+
+# Process pool and the renders in flight, by receipt key
+_lock = threading.RLock()
+_pool = None
+_inflight = {}
+
+
+class ReceiptError(Exception):
+    pass
+
+
+class RenderMetrics:
+    """Counters of this process's receipt rendering, for the metrics endpoint"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.rendered = 0
+        self.failed = 0
+        self.dropped = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.render_seconds_total = 0.0
+        self.render_seconds_max = 0.0
+        self.last_render_seconds = None
+
+    def count(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def record_render(self, seconds):
+        with self._lock:
+            self.rendered += 1
+            self.render_seconds_total += seconds
+            self.render_seconds_max = max(self.render_seconds_max, seconds)
+            self.last_render_seconds = seconds
+
+    def snapshot(self):
+        with self._lock:
+            average = self.render_seconds_total / self.rendered if self.rendered else None
+            data = {
+                'workers': render_workers(),
+                'submitted': self.submitted,
+                'rendered': self.rendered,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses,
+                'avg_render_ms': round(average * 1000, 1) if average is not None else None,
+                'max_render_ms': round(self.render_seconds_max * 1000, 1),
+                'last_render_ms': round(self.last_render_seconds * 1000, 1) if self.last_render_seconds is not None else None,
+            }
+        with _lock:
+            data['queue_depth'] = len(_inflight)
+        return data
+
+
+metrics = RenderMetrics()
+
+
+def render_workers():
+    return getattr(settings, 'RECEIPT_RENDER_WORKERS', DEFAULT_WORKERS)
+
+
+def cache_dir():
+    path = Path(getattr(settings, 'RECEIPT_CACHE_DIR', Path(settings.MEDIA_ROOT) / 'receipts'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def receipt_file_name(order):
+    return f"chek_{order.id}.pdf"
+
+
+def receipt_html(order):
+    items = order.items.select_related('product')
+    return render_to_string(RECEIPT_TEMPLATE, {'order': order, 'items': items})
+
+
+def receipt_key(html):
+    return hashlib.sha256(html.encode('utf-8')).hexdigest()[:32]
+
+
+def cached_path(order_id, key):
+    return cache_dir() / f"{order_id}-{key}.pdf"
+
+
+def render_pdf(html):
+    """PDF bytes for the receipt HTML"""
+    output = BytesIO()
+    pisa_status = pisa.CreatePDF(html, dest=output)
+    if pisa_status.err:
+        raise ReceiptError("PDF yaratishda xatolik")
+    return output.getvalue()
+
+
+def timed_render(html):
+    """(PDF bytes, seconds spent); runs in a pool process"""
+    started = time.perf_counter()
+    pdf = render_pdf(html)
+    return pdf, time.perf_counter() - started
+
+
+def store(order_id, key, pdf):
+    """
+    Write a rendered receipt into the cache and drop the order's older versions.
+
+    The PDF is written to a temporary name and renamed into place, so a
+    concurrent request never reads a half-written file.
+    """
+    path = cached_path(order_id, key)
+    if path.exists():
+        return path
+
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir(), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as output:
+            output.write(pdf)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    invalidate(order_id, keep=path)
+    evict(
+        max_bytes=getattr(settings, 'RECEIPT_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES),
+        keep=path,
+        directory=cache_dir(),
+    )
+    return path
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # spawn: a forked copy of a threaded server process can inherit held locks
+        _pool = ProcessPoolExecutor(
+            max_workers=render_workers(),
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+    return _pool
+
+
+def warm_up():
+    """Start the pool from a background thread, so the first checkout does not wait for it"""
+    if render_workers() <= 0 or _pool is not None:
+        return
+
+    def start():
+        with _lock:
+            # Workers are started by the first submit
+            future = _get_pool().submit(int)
+        # Waited for outside the lock, so submits are not held up meanwhile
+        future.result()
+
+    threading.Thread(target=start, name='receipt-pool-warm-up', daemon=True).start()
+
+
+def _finished(order_id, key, future):
+    global _pool
+    with _lock:
+        _inflight.pop(key, None)
+    try:
+        pdf, seconds = future.result()
+    except BrokenProcessPool:
+        metrics.count('failed')
+        with _lock:
+            # A worker died; the next submit starts a fresh pool
+            _pool = None
+        return
+    except Exception as e:
+        metrics.count('failed')
+        print(f"Receipt {order_id} render failed: {e}")
+        return
+    metrics.record_render(seconds)
+    store(order_id, key, pdf)
+
+
+def submit(order_id, key, html):
+    """The render of this receipt version, started now unless it is already in flight"""
+    global _pool
+    with _lock:
+        future = _inflight.get(key)
+        if future is None:
+            try:
+                future = _get_pool().submit(timed_render, html)
+            except BrokenProcessPool:
+                _pool = None
+                future = _get_pool().submit(timed_render, html)
+            _inflight[key] = future
+            metrics.count('submitted')
+            future.add_done_callback(partial(_finished, order_id, key))
+        return future
+
+
+def get_or_render(order):
+    """The cached receipt of an order, rendered on a miss"""
+    html = receipt_html(order)
+    key = receipt_key(html)
+    path = cached_path(order.id, key)
+
+    if path.exists():
+        metrics.count('cache_hits')
+    else:
+        metrics.count('cache_misses')
+        if render_workers() > 0:
+            future = submit(order.id, key, html)
+            try:
+                pdf, _ = future.result(timeout=getattr(settings, 'RECEIPT_RENDER_TIMEOUT', DEFAULT_TIMEOUT))
+            except FutureTimeoutError:
+                raise ReceiptError("PDF yaratish vaqti tugadi")
+            except BrokenProcessPool:
+                raise ReceiptError("PDF yaratishda xatolik")
+        else:
+            pdf, seconds = timed_render(html)
+            metrics.record_render(seconds)
+        # Usually already written by the render's callback
+        store(order.id, key, pdf)
+
+    # The file's mtime is its render time: it is the Last-Modified date,
+    # so it is not touched on reads
+    last_modified = datetime.fromtimestamp(path.stat().st_mtime, tz=dt_timezone.utc)
+    return ExportArtifact(path, f'"{key}"', last_modified)
+
+
+def prerender(order):
+    """
+    Queue a new order's receipt for rendering in the pool. Skipped when it
+    is already cached, when there is no pool, or when RECEIPT_RENDER_QUEUE_MAX
+    renders are already waiting (the download then renders it on demand).
+    """
+    if render_workers() <= 0:
+        return
+    html = receipt_html(order)
+    key = receipt_key(html)
+    if cached_path(order.id, key).exists():
+        return
+    with _lock:
+        if key not in _inflight and len(_inflight) >= getattr(settings, 'RECEIPT_RENDER_QUEUE_MAX', DEFAULT_QUEUE_MAX):
+            metrics.count('dropped')
+            return
+        submit(order.id, key, html)
+
+
+def invalidate(order_id, keep=None):
+    """Delete the cached receipts of an order (except keep)"""
+    for path in cache_dir().glob(f"{order_id}-*.pdf"):
+        if path != keep:
+            path.unlink(missing_ok=True)
@@ -1,3 +1,151 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+
+from products.models import Product
+from .checkout import CheckoutError, checkout, parse_items
+from .models import DailySalesRollup, Order, OrderItem
+from .pagination import decode_cursor, encode_cursor, keyset_page
+
+
+class ParseItemsTests(TestCase):
+    def test_blank_rows_are_skipped(self):
+        items = parse_items(['1', '', '2'], ['2', '3', '1.5'], ['', '', '1200'])
+        self.assertEqual(items, [(1, Decimal('2.00'), None), (2, Decimal('1.50'), Decimal('1200.00'))])
+
+    def test_malformed_and_non_positive_rows_are_errors(self):
+        with self.assertRaises(CheckoutError) as raised:
+            parse_items(['1', '2'], ['abc', '0'], ['', ''])
+        self.assertEqual(len(raised.exception.errors), 2)
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user('kassir', password='x')
+        self.pipe = Product.objects.create(name='Truba 20', brand='Pro', price=Decimal('1000'), quantity=Decimal('10'), unit='metr')
+        self.valve = Product.objects.create(name='Kran', brand='Valtec', price=Decimal('5000'), quantity=Decimal('2'), unit='dona')
+
+    def sell(self, items, discount=Decimal('0')):
+        return checkout(items, None, discount, 'cash', self.seller)
+
+    def assertStock(self, product, quantity):
+        product.refresh_from_db()
+        self.assertEqual(product.quantity, Decimal(quantity))
+
+    def test_basket_becomes_one_order(self):
+        order = self.sell([
+            (self.pipe.id, Decimal('3'), None),
+            (self.valve.id, Decimal('1'), Decimal('4500')),
+        ], discount=Decimal('10'))
+
+        self.assertEqual(order.item_count, 2)
+        self.assertEqual(order.total_price, Decimal('7500.00'))
+        self.assertEqual(order.final_price, Decimal('6750.00'))
+        self.assertEqual(order.discount, Decimal('10.00'))
+        self.assertEqual(
+            list(order.items.values_list('product_id', 'unit_price', 'final_price')),
+            [(self.pipe.id, Decimal('1000.00'), Decimal('2700.00')), (self.valve.id, Decimal('4500.00'), Decimal('4050.00'))],
+        )
+        self.assertStock(self.pipe, '7')
+        self.assertStock(self.valve, '1')
+
+    def test_short_line_rolls_back_the_whole_basket(self):
+        with self.assertRaises(CheckoutError) as raised:
+            self.sell([
+                (self.pipe.id, Decimal('3'), None),
+                (self.valve.id, Decimal('5'), None),
+            ])
+
+        self.assertEqual(len(raised.exception.errors), 1)
+        self.assertIn('Kran', raised.exception.errors[0])
+        self.assertStock(self.pipe, '10')
+        self.assertStock(self.valve, '2')
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertFalse(DailySalesRollup.objects.exists())
+
+    def test_missing_product_is_rejected(self):
+        with self.assertRaises(CheckoutError):
+            self.sell([(self.pipe.id, Decimal('1'), None), (self.valve.id + 100, Decimal('1'), None)])
+        self.assertStock(self.pipe, '10')
+        self.assertFalse(Order.objects.exists())
+
+    def test_repeated_product_is_checked_against_its_combined_quantity(self):
+        # 6 + 6 is more than the 10 in stock even though each line alone fits
+        with self.assertRaises(CheckoutError):
+            self.sell([(self.pipe.id, Decimal('6'), None), (self.pipe.id, Decimal('6'), None)])
+        self.assertStock(self.pipe, '10')
+
+        order = self.sell([(self.pipe.id, Decimal('4'), None), (self.pipe.id, Decimal('6'), None)])
+        self.assertEqual(order.item_count, 2)
+        self.assertStock(self.pipe, '0')
+
+    def test_snapshot_and_rollup_match_a_rebuild(self):
+        self.sell([(self.pipe.id, Decimal('2.5'), None), (self.valve.id, Decimal('1'), None)], discount=Decimal('5'))
+        self.sell([(self.pipe.id, Decimal('1'), Decimal('900')), (self.pipe.id, Decimal('1'), None)])
+        with self.assertRaises(CheckoutError):
+            self.sell([(self.valve.id, Decimal('3'), None)])
+
+        for command, message in (('rebuild_inventory_snapshot', 'Snapshot is up to date'), ('rebuild_sales_rollup', 'Rollup is up to date')):
+            output = StringIO()
+            call_command(command, '--check', stdout=output)
+            self.assertNotIn('Drift', output.getvalue())
+            self.assertIn(message, output.getvalue())
+
+
+class KeysetPageTests(TestCase):
+    def setUp(self):
+        seller = User.objects.create_user('kassir', password='x')
+        start = timezone.now().replace(microsecond=123456) - timedelta(days=1)
+        # Four orders share one sale_date across the first page boundary, so pages must break ties on id
+        offsets = [0, 1, 1, 1, 1, 3, 5]
+        for offset in offsets:
+            Order.objects.create(seller=seller, sale_date=start + timedelta(minutes=offset))
+        self.newest_first = list(Order.objects.order_by('-sale_date', '-id').values_list('id', flat=True))
+
+    def page(self, **params):
+        return keyset_page(Order.objects.all(), params, per_page=3)
+
+    def ids(self, page):
+        return [order.id for order in page]
+
+    def test_cursor_round_trip(self):
+        order = Order.objects.first()
+        self.assertEqual(decode_cursor(encode_cursor(order)), (order.sale_date, order.id))
+        for value in (None, '', 'abc', '12-', '-3', '1.5-2'):
+            self.assertIsNone(decode_cursor(value), value)
+
+    def test_after_cursors_walk_every_order_once(self):
+        page = self.page()
+        self.assertFalse(page.has_previous)
+        seen = self.ids(page)
+        while page.has_next:
+            page = self.page(after=page.next_cursor)
+            self.assertTrue(page.has_previous)
+            seen += self.ids(page)
+
+        self.assertEqual(seen, self.newest_first)
+        self.assertEqual(len(page), 1)
+        self.assertIsNone(page.next_cursor)
+
+    def test_before_cursors_walk_back_over_the_same_pages(self):
+        pages = [self.page()]
+        while pages[-1].has_next:
+            pages.append(self.page(after=pages[-1].next_cursor))
+
+        page = pages[-1]
+        for expected in reversed(pages[:-1]):
+            page = self.page(before=page.previous_cursor)
+            self.assertEqual(self.ids(page), self.ids(expected))
+            self.assertTrue(page.has_next)
+        self.assertFalse(page.has_previous)
+        self.assertIsNone(page.previous_cursor)
 
-# Create your tests here.
+    def test_malformed_cursor_gives_the_first_page(self):
+        self.assertEqual(self.ids(self.page(after='nonsense')), self.newest_first[:3])
+        self.assertEqual(self.ids(self.page(before='1-')), self.newest_first[:3])
@@ -1,12 +1,21 @@
 from django.urls import path
-from .views import sale_create, sale_list, sale_detail, sale_receipt, sale_qr_code, get_client_discount, get_product_info
+from .views import sale_create, sale_list, sale_detail, sale_receipt, sale_qr_code, get_client_discount, get_product_info, export_sales_csv, export_sales_ndjson, sales_report, receipt_metrics, product_info_batch, product_catalog, product_autocomplete, product_scan, product_scan_batch
 
 urlpatterns = [
     path('', sale_list, name='sale_list'),
     path('create/', sale_create, name='sale_create'),
+    path('report/', sales_report, name='sales_report'),
     path('<int:id>/', sale_detail, name='sale_detail'),
     path('<int:id>/receipt/', sale_receipt, name='sale_receipt'),
     path('<int:id>/qr/', sale_qr_code, name='sale_qr_code'),
+    path('receipts/metrics/', receipt_metrics, name='receipt_metrics'),
     path('get-client-discount/', get_client_discount, name='get_client_discount'),
     path('get-product-info/', get_product_info, name='get_product_info'),
+    path('product-info/', product_info_batch, name='product_info_batch'),
+    path('catalog/', product_catalog, name='product_catalog'),
+    path('autocomplete/', product_autocomplete, name='product_autocomplete'),
+    path('scan/', product_scan, name='product_scan'),
+    path('scan/batch/', product_scan_batch, name='product_scan_batch'),
+    path('export/csv/', export_sales_csv, name='sale_export_csv'),
+    path('export/ndjson/', export_sales_ndjson, name='sale_export_ndjson'),
 ]
\ No newline at end of file
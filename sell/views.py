@@ -1,51 +1,160 @@
 from django.forms import formset_factory
 from django.urls import reverse
-import qrcode
 import json
-from io import BytesIO
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, JsonResponse
-from django.template.loader import render_to_string
-from django.db.models import Sum
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from datetime import timedelta
+from functools import partial
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.contrib.auth.models import User
 from django.utils import timezone
-from xhtml2pdf import pisa
-from decimal import Decimal
-from django.core.exceptions import ValidationError
-from .models import Sale
+from .models import Order, DailySalesRollup
 from .forms import SaleForm, SaleItemForm
 from clients.models import Account
-from products.models import Product
+from products.models import Product, normalize_barcode
+from products.catalog import catalog_payload, current_version
+from products.typeahead import autocomplete, DEFAULT_LIMIT as AUTOCOMPLETE_LIMIT
+from products.exporting import iter_csv, iter_ndjson, CSV_CONTENT_TYPE, NDJSON_CONTENT_TYPE
+from .filters import filter_sales, filter_orders, parse_id, date_bounds, SALE_FILTER_PARAMS
+from products.filters import parse_date_range
+from .pagination import keyset_page
+from .checkout import parse_items, checkout, CheckoutError
+from . import receipts
+from .qr import get_qr, qr_key, QR_CONTENT_TYPES
+from django.utils.cache import get_conditional_response
+from products import export_cache
+from .exporting import iter_sale_records, SALE_FIELDS
+
+SALES_PER_PAGE = 50
+
+# Default period of the sales report, in days
+REPORT_DEFAULT_DAYS = 30
+REPORT_TOP_PRODUCTS = 10
+
+# QR images never change for a given link, so browsers may keep them for a year
+QR_MAX_AGE = 365 * 24 * 60 * 60
+
+# Most product (or client) IDs one product_info_batch call answers
+PRODUCT_INFO_MAX_IDS = 200
+
+# Most distinct barcodes one product_scan_batch call answers
+SCAN_BATCH_MAX_CODES = 200
+
+SCAN_FIELDS = ['id', 'name', 'brand', 'barcode', 'price', 'quantity', 'unit']
 
 @login_required
 def sale_list(request):
     try:
-        sales = Sale.objects.all().select_related('product', 'client', 'seller').order_by('-sale_date')
+        orders = filter_orders(request.GET)
+        
+        # Header statistics for the filtered set, in one aggregate query
+        today_start, today_end = date_bounds(timezone.localdate(), timezone.localdate())
+        today = Q(sale_date__gte=today_start, sale_date__lt=today_end)
+        stats = orders.aggregate(
+            total_sales=Count('id'),
+            total_revenue=Sum('final_price'),
+            today_sales=Count('id', filter=today),
+            today_revenue=Sum('final_price', filter=today),
+        )
         
-        # Statistics
-        total_sales = sales.count()
-        total_revenue = sales.aggregate(total=Sum('final_price'))['total'] or 0
-        today_sales = sales.filter(sale_date__date=timezone.now().date())
-        today_revenue = today_sales.aggregate(total=Sum('final_price'))['total'] or 0
+        # Only one page of orders is loaded, addressed by (sale_date, id) instead of an offset
+        page = keyset_page(
+            orders.select_related('client', 'seller').prefetch_related('items__product'),
+            request.GET,
+            SALES_PER_PAGE,
+        )
         
         context = {
-            'sales': sales,
-            'total_sales': total_sales,
-            'total_revenue': total_revenue,
-            'today_sales': today_sales.count(),
-            'today_revenue': today_revenue,
+            'orders': page,
+            'page': page,
+            'total_sales': stats['total_sales'],
+            'total_revenue': stats['total_revenue'] or 0,
+            'today_sales': stats['today_sales'],
+            'today_revenue': stats['today_revenue'] or 0,
         }
-        return render(request, 'sell/sale_list.html', context)
     except Exception as e:
         # Agar hali jadval yaratilmagan bo'lsa
+        print(f"sale_list error: {e}")
         context = {
-            'sales': [],
+            'orders': [],
+            'page': None,
             'total_sales': 0,
             'total_revenue': 0,
             'today_sales': 0,
             'today_revenue': 0,
         }
-        return render(request, 'sell/sale_list.html', context)
+    
+    context.update({
+        'sellers': User.objects.filter(is_active=True).order_by('username'),
+        'clients': Account.objects.order_by('name', 'lname'),
+        'unit_choices': Product.UNIT_CHOICES,
+        'payment_methods': Order.PAYMENT_METHODS,
+        'filters': {key: request.GET.get(key, '') for key in SALE_FILTER_PARAMS},
+    })
+    return render(request, 'sell/sale_list.html', context)
+
+@login_required
+def sales_report(request):
+    """Revenue by day, product, seller and payment method, read from the daily rollup only"""
+    date_from, date_to = parse_date_range(request.GET)
+    date_to = date_to or timezone.localdate()
+    date_from = date_from or date_to - timedelta(days=REPORT_DEFAULT_DAYS - 1)
+    
+    rollups = DailySalesRollup.objects.filter(date__gte=date_from, date__lte=date_to)
+    seller_id = parse_id(request.GET, 'seller')
+    if seller_id is not None:
+        rollups = rollups.filter(seller_id=seller_id)
+    payment_method = request.GET.get('payment_method', '')
+    if payment_method:
+        rollups = rollups.filter(payment_method=payment_method)
+    
+    totals = rollups.aggregate(
+        quantity=Sum('quantity'),
+        gross=Sum('gross'),
+        discount=Sum('discount'),
+        net=Sum('net'),
+        line_count=Sum('line_count'),
+    )
+    daily = list(
+        rollups.values('date')
+        .annotate(net=Sum('net'), gross=Sum('gross'), quantity=Sum('quantity'), line_count=Sum('line_count'))
+        .order_by('date')
+    )
+    best_day = max((day['net'] for day in daily), default=0)
+    for day in daily:
+        day['percent'] = int(day['net'] * 100 / best_day) if best_day else 0
+    
+    top_products = (
+        rollups.values('product_id', 'product__name', 'product__brand', 'product__unit')
+        .annotate(net=Sum('net'), quantity=Sum('quantity'))
+        .order_by('-net')[:REPORT_TOP_PRODUCTS]
+    )
+    payment_labels = dict(Order.PAYMENT_METHODS)
+    by_payment = [
+        dict(row, label=payment_labels.get(row['payment_method'], row['payment_method']))
+        for row in rollups.values('payment_method').annotate(net=Sum('net')).order_by('-net')
+    ]
+    by_seller = (
+        rollups.values('seller_id', 'seller__username', 'seller__first_name', 'seller__last_name')
+        .annotate(net=Sum('net'), line_count=Sum('line_count'))
+        .order_by('-net')
+    )
+    
+    return render(request, 'sell/sales_report.html', {
+        'date_from': date_from,
+        'date_to': date_to,
+        'totals': {key: value or 0 for key, value in totals.items()},
+        'daily': daily,
+        'top_products': top_products,
+        'by_payment': by_payment,
+        'by_seller': by_seller,
+        'sellers': User.objects.filter(is_active=True).order_by('username'),
+        'payment_methods': Order.PAYMENT_METHODS,
+        'seller_filter': request.GET.get('seller', ''),
+        'payment_filter': payment_method,
+    })
 
 @login_required
 def sale_create(request):
@@ -67,81 +176,19 @@ def sale_create(request):
                 # Debug print
                 print(f"DEBUG POST: products={product_ids}, quantities={quantities}, unit_prices={unit_prices}")
                 
-                total_final_price = Decimal('0')
-                saved_sales = []
-                
-                # Process each item
-                for i in range(len(product_ids)):
-                    if i >= len(quantities) or i >= len(unit_prices):
-                        print(f"Skipping item {i}: Lists mismatch")
-                        continue
-                    
-                    product_id = product_ids[i].strip()
-                    quantity_str = quantities[i].strip()
-                    unit_price_str = unit_prices[i].strip()
-                    
-                    if not product_id or not quantity_str:
-                        print(f"Skipping item {i}: missing product or quantity")
-                        continue
-                    
-                    try:
-                        product = Product.objects.get(id=product_id)
-                        quantity = Decimal(quantity_str)
-                        if quantity <= 0:
-                            print(f"Skipping item {i}: quantity <= 0")
-                            continue
-                        
-                        # Check stock here too, but model will validate
-                        if quantity > product.quantity:
-                            form.add_error(None, f"Mahsulot '{product.name}' uchun yetarli miqdor yo'q. Mavjud: {product.quantity}")
-                            continue
-                            
-                        unit_price = Decimal(unit_price_str) if unit_price_str else product.price
-                        
-                        # Calculate item totals
-                        total_price = quantity * unit_price
-                        discount_amount = total_price * (discount / Decimal('100'))
-                        final_price = total_price - discount_amount
-                        total_final_price += final_price
-                        
-                        # Create and save Sale for each item
-                        sale = Sale(
-                            client=client,
-                            product=product,
-                            quantity=quantity,
-                            unit_price=unit_price,
-                            total_price=total_price,
-                            discount=discount,
-                            final_price=final_price,
-                            payment_method=payment_method,
-                            seller=request.user
-                        )
-                        sale.save()  # Model will re-validate and update stock
-                        saved_sales.append(sale)
-                        print(f"Saved sale {sale.id} for {product.name}")
-                        
-                    except Product.DoesNotExist:
-                        print(f"Item {i}: Product {product_id} not found")
-                        form.add_error(None, f"Mahsulot {product_id} topilmadi")
-                        continue
-                    except ValidationError as ve:
-                        print(f"Item {i}: Validation error {ve}")
-                        form.add_error(None, str(ve))
-                        continue
-                    except ValueError:
-                        print(f"Item {i}: ValueError in Decimal conversion")
-                        form.add_error(None, "Miqdor yoki narx noto'g'ri formatda")
-                        continue
-                    except Exception as item_error:
-                        print(f"Item {i}: Unexpected error {item_error}")
-                        form.add_error(None, f"Item {i} saqlashda xato: {str(item_error)}")
-                        continue
-                
-                if saved_sales:
-                    print(f"Successfully saved {len(saved_sales)} sales")
-                    return redirect('sale_list')
+                # The whole basket is saved in one transaction, or nothing is
+                try:
+                    items = parse_items(product_ids, quantities, unit_prices)
+                    order = checkout(items, client, discount, payment_method, request.user)
+                except CheckoutError as e:
+                    print(f"Checkout rejected: {e}")
+                    for error in e.errors:
+                        form.add_error(None, error)
                 else:
-                    form.add_error(None, "Hech qanday mahsulot saqlanmadi. Miqdor va mahsulotni tekshiring.")
+                    print(f"Successfully saved order #{order.id} with {order.item_count} items")
+                    # Render the receipt in the background so the download finds it ready
+                    transaction.on_commit(partial(prerender_receipt, order))
+                    return redirect('sale_list')
                     
             except Exception as e:
                 print(f"Overall error in sale_create: {e}")
@@ -151,67 +198,64 @@ def sale_create(request):
             print("Form invalid:", form.errors)
     else:
         form = SaleForm()
+        receipts.warm_up()
     
-    # Products for dropdown - only available
-    all_products = Product.objects.filter(quantity__gt=0).order_by('name')
+    # The product dropdowns are filled from the cached catalog (product_catalog)
     recent_products = Product.objects.filter(quantity__gt=0).order_by('-created_at')[:10]
     
-    print(f"DEBUG: Total available products: {all_products.count()}")
-    
     return render(request, 'sell/sale_form.html', {
         'form': form,
-        'all_products': all_products,
         'recent_products': recent_products
     })
 
 @login_required
 def sale_detail(request, id):
-    sale = get_object_or_404(Sale, id=id)
-    return render(request, 'sell/sale_detail.html', {'sale': sale})
+    order = get_object_or_404(Order.objects.select_related('client', 'seller'), id=id)
+    items = order.items.select_related('product')
+    return render(request, 'sell/sale_detail.html', {'order': order, 'items': items})
 
 @login_required
 def sale_receipt(request, id):
-    sale = get_object_or_404(Sale, id=id)
-    
-    # Generate PDF receipt using xhtml2pdf
-    html_string = render_to_string('sell/receipt_pdf.html', {'sale': sale})
-    
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="chek_{sale.id}.pdf"'
-    
-    # Create PDF
-    pisa_status = pisa.CreatePDF(html_string, dest=response)
+    order = get_object_or_404(Order.objects.select_related('client', 'seller'), id=id)
     
-    if pisa_status.err:
+    # Rendered with xhtml2pdf once, then served from the receipt cache (304 when unchanged)
+    try:
+        artifact = receipts.get_or_render(order)
+    except receipts.ReceiptError:
         return HttpResponse('PDF yaratishda xatolik')
-    return response
+    return export_cache.serve(request, artifact, receipts.receipt_file_name(order), receipts.PDF_CONTENT_TYPE)
+
+def prerender_receipt(order):
+    try:
+        receipts.prerender(order)
+    except Exception as e:
+        # The receipt is rendered on demand instead
+        print(f"Receipt prerender failed for order #{order.id}: {e}")
 
-# ... (imports and sale fetch stay the same)
+@login_required
+def receipt_metrics(request):
+    """Receipt rendering counters of this server process: queue depth, render times, cache hits"""
+    return JsonResponse(receipts.metrics.snapshot())
 
 @login_required
 def sale_qr_code(request, id):
-    sale = get_object_or_404(Sale, id=id)
-    
-    # Build the full URL to the receipt—portable and precise!
-    receipt_url = request.build_absolute_uri(reverse('sale_receipt', args=[sale.id]))
-    print(f"DEBUG: QR encoding URL: {receipt_url}")  # For your console curiosity—what does it look like?
-    
-    # Generate QR code with the URL (no JSON needed now—pure action!)
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(receipt_url)  # Etch the invitation!
-    qr.make(fit=True)
+    order = get_object_or_404(Order.objects.only('id'), id=id)
     
-    img = qr.make_image(fill_color="black", back_color="white")
-    buffer = BytesIO()
-    img.save(buffer, format='PNG')
-    buffer.seek(0)
+    # The QR encodes the full receipt URL; ?format=svg gives a compact vector image
+    image_format = request.GET.get('format', 'png')
+    if image_format not in QR_CONTENT_TYPES:
+        image_format = 'png'
+    receipt_url = request.build_absolute_uri(reverse('sale_receipt', args=[order.id]))
     
-    return HttpResponse(buffer.getvalue(), content_type='image/png')
+    # Pure function of the URL: served from the QR cache, and never changes for a given ETag
+    etag = f'"{qr_key(receipt_url, image_format)}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        image, _ = get_qr(receipt_url, image_format)
+        response = HttpResponse(image, content_type=QR_CONTENT_TYPES[image_format])
+    response['ETag'] = etag
+    response['Cache-Control'] = f'private, max-age={QR_MAX_AGE}, immutable'
+    return response
 
 # AJAX views for dynamic functionality
 @login_required
@@ -237,4 +281,136 @@ def get_product_info(request):
             'brand': product.brand
         })
     except Product.DoesNotExist:
-        return JsonResponse({'price': '0', 'quantity': '0', 'unit': '', 'name': '', 'brand': ''})
\ No newline at end of file
+        return JsonResponse({'price': '0', 'quantity': '0', 'unit': '', 'name': '', 'brand': ''})
+
+def parse_id_list(value, limit=PRODUCT_INFO_MAX_IDS):
+    """Distinct integer IDs from a comma-separated list, malformed entries skipped"""
+    ids = []
+    for part in value.split(','):
+        part = part.strip()
+        if part.isdigit() and int(part) not in ids:
+            ids.append(int(part))
+    return ids[:limit]
+
+@login_required
+def product_info_batch(request):
+    """
+    Price, stock, unit and name of many products, and discounts of clients,
+    in one response: ?ids=1,2,3&clients=4. Used by the sale form instead of
+    one get_product_info call per basket row.
+    """
+    product_ids = parse_id_list(request.GET.get('ids', ''))
+    client_ids = parse_id_list(request.GET.get('clients', ''))
+    
+    products = Product.objects.only('id', 'name', 'brand', 'price', 'quantity', 'unit').in_bulk(product_ids) if product_ids else {}
+    clients = Account.objects.only('id', 'skidka').in_bulk(client_ids) if client_ids else {}
+    
+    return JsonResponse({
+        'products': {
+            product.id: {
+                'price': str(product.price),  # String for JS
+                'quantity': str(product.quantity),
+                'unit': product.unit,
+                'name': product.name,
+                'brand': product.brand,
+            }
+            for product in products.values()
+        },
+        'clients': {client.id: {'discount': client.skidka} for client in clients.values()},
+        'missing': [product_id for product_id in product_ids if product_id not in products],
+    })
+
+def scan_line(product, count=1):
+    """A scanned product (a dict of SCAN_FIELDS) as a sale form basket line"""
+    return {
+        'product_id': product['id'],
+        'name': product['name'],
+        'brand': product['brand'],
+        'barcode': product['barcode'],
+        'unit_price': str(product['price']),
+        'stock': str(product['quantity']),
+        'unit': product['unit'],
+        'quantity': count,
+    }
+
+@login_required
+def product_scan(request):
+    """The basket line for one scanned code: ?code=4780012345678, one seek on the unique barcode index"""
+    code = normalize_barcode(request.GET.get('code'))
+    try:
+        product = Product.objects.values(*SCAN_FIELDS).get(barcode=code) if code else None
+    except Product.DoesNotExist:
+        product = None
+    if product is None:
+        return JsonResponse({'error': "Shtrix-kod bo'yicha mahsulot topilmadi", 'code': code}, status=404)
+    return JsonResponse({'line': scan_line(product)})
+
+@login_required
+def product_scan_batch(request):
+    """
+    Basket lines for a burst of scans: ?codes=a,b,a. A code scanned several
+    times is one line with that many items. Lines keep the order of first
+    scan; unknown codes are listed under 'missing'.
+    """
+    counts = {}
+    for part in request.GET.get('codes', '').split(','):
+        code = normalize_barcode(part)
+        if code and (code in counts or len(counts) < SCAN_BATCH_MAX_CODES):
+            counts[code] = counts.get(code, 0) + 1
+    
+    products = {
+        product['barcode']: product
+        for product in Product.objects.filter(barcode__in=list(counts)).values(*SCAN_FIELDS)
+    } if counts else {}
+    
+    return JsonResponse({
+        'lines': [scan_line(products[code], count) for code, count in counts.items() if code in products],
+        'missing': [code for code in counts if code not in products],
+    })
+
+@login_required
+def product_catalog(request):
+    """
+    The in-stock catalog for the sale form, as versioned compact JSON.
+    ?since=<version> gives only the products changed after that version.
+    """
+    since = request.GET.get('since', '')
+    version = current_version()
+    
+    # The response is fixed by (since, version), so an unchanged catalog is a 304
+    etag = f'"{since}:{version}"' if since else f'"{version}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(catalog_payload(since, version=version))
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+@login_required
+def product_autocomplete(request):
+    """
+    Top in-stock matches for what the cashier has typed so far, from the
+    in-memory typeahead index: ?q=seme&limit=10.
+    """
+    query = request.GET.get('q', '')
+    try:
+        limit = int(request.GET.get('limit', AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        limit = AUTOCOMPLETE_LIMIT
+    return JsonResponse({'results': autocomplete(query, limit=limit)})
+
+@login_required
+def export_sales_csv(request):
+    """Stream the sales ledger as CSV, filtered like the product list plus a date range"""
+    records = iter_sale_records(filter_sales(request.GET))
+    response = StreamingHttpResponse(iter_csv(SALE_FIELDS, records), content_type=CSV_CONTENT_TYPE)
+    response['Content-Disposition'] = 'attachment; filename="sotuvlar.csv"'
+    return response
+
+@login_required
+def export_sales_ndjson(request):
+    """Stream the sales ledger as JSON lines, one object per sale line"""
+    records = iter_sale_records(filter_sales(request.GET))
+    response = StreamingHttpResponse(iter_ndjson(SALE_FIELDS, records), content_type=NDJSON_CONTENT_TYPE)
+    response['Content-Disposition'] = 'attachment; filename="sotuvlar.ndjson"'
+    return response